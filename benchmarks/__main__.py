@@ -0,0 +1,58 @@
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+from . import cases # registra os casos
+from .runner import compare, load, run, save, select
+
+HERE = Path(__file__).parent
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks dos caminhos críticos do PAC, com dados sintéticos.')
+    parser.add_argument('patterns', nargs='*', help='Casos executados (padrões como "measure.*"); todos por padrão.')
+    parser.add_argument('--repeat', type=int, default=10, help='Número de execuções medidas de cada caso.')
+    parser.add_argument('--warmup', type=int, default=1, help='Número de execuções descartadas antes da medição.')
+    parser.add_argument('--output', type=Path, default=HERE/'results'/'latest.json', help='Arquivo JSON dos resultados.')
+    parser.add_argument('--baseline', type=Path, default=HERE/'baseline.json', help='Resultados de referência.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Aumento relativo da mediana considerado regressão.')
+    parser.add_argument('--save-baseline', action='store_true', help='Salva os resultados como nova referência.')
+    parser.add_argument('--list', action='store_true', help='Lista os casos e sai.')
+    args = parser.parse_args(argv)
+
+    selected = select(args.patterns)
+    if args.list or not selected:
+        print('\n'.join(case.name for case in selected) or 'Nenhum caso encontrado.')
+        return 0
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = run(selected, Path(directory), args.repeat, args.warmup)
+    save(report, args.output)
+    print(f'Resultados salvos em {args.output}')
+    failures = [name for name, result in report['results'].items() if 'error' in result]
+    if failures:
+        print(f'{len(failures)} caso(s) com erro: {", ".join(failures)}')
+
+    if args.save_baseline:
+        save(report, args.baseline)
+        print(f'Referência salva em {args.baseline}')
+        return int(bool(failures))
+    if not args.baseline.exists():
+        print(f'Sem referência em {args.baseline} (use --save-baseline para criá-la).')
+        return int(bool(failures))
+
+    baseline = load(args.baseline)
+    for key in ('machine', 'processor', 'cpus'):
+        if baseline['environment'].get(key) != report['environment'][key]:
+            print(f'Aviso: a referência foi medida em outro ambiente ({key}: {baseline["environment"].get(key)} != {report["environment"][key]}).')
+    rows = compare(report, baseline, args.tolerance)
+    print(f'\n{"caso":<40} {"atual":>10} {"referência":>10} {"razão":>7}')
+    for name, current, reference, ratio, regression in rows:
+        print(f'{name:<40} {current:10.2f} {reference:10.2f} {ratio:7.2f}' + ('  REGRESSÃO' if regression else ''))
+    regressions = [row[0] for row in rows if row[-1]]
+    if regressions:
+        print(f'\n{len(regressions)} regressão(ões) acima de {args.tolerance:.0%}: {", ".join(regressions)}')
+        return 1
+    return int(bool(failures))
+
+if __name__ == '__main__':
+    sys.exit(main())
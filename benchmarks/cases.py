@@ -0,0 +1,106 @@
+import json
+import os
+import sys
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .runner import ROOT, case
+from .synthetic import jpeg_bytes, pellet_sample, report_inputs, write_dataset
+
+# Casos de benchmark dos caminhos críticos: medição da escala, carregamento dos dados de treinamento,
+# inferência da U-Net, API de medição e relatórios. Todos usam apenas dados sintéticos (ver `synthetic`).
+
+BATCH_SIZES = (1, 8, 32)
+FILTERS = (16, 32, 64)
+PHOTO_SIZE = (1024, 768)
+LOAD_REQUESTS = 16
+LOAD_THREADS = 4
+
+def gray_sample(seed=0):
+    image, _ = pellet_sample(seed=seed)
+    gray = np.asarray(image.convert('L'), np.float32)
+    return (gray - gray.min())/(gray.max() - gray.min())
+
+def backend():
+    # a aplicação é importada como no servidor (diretório `pac-backend`), sem carregamento antecipado
+    os.environ.setdefault('PAC_PRELOAD', '0')
+    sys.path.insert(0, str(ROOT/'pac-backend'))
+    import app
+    return app
+
+@case('measure.find_scale')
+def find_scale(directory):
+    from src.measure import find_scale
+    image = gray_sample()
+    return lambda: find_scale(image)
+
+@case('measure.find_slope')
+def find_slope(directory):
+    from src.measure import find_slope
+    image = gray_sample()
+    return lambda: find_slope(image)
+
+@case('data.load_collection', items=32)
+def load_collection(directory):
+    from src.data import load_collection
+    jpg_files = write_dataset(directory/'dataset', n=32)
+    return lambda: load_collection(jpg_files)
+
+@case('data.flipping_augmentation', items=32)
+def flipping_augmentation(directory):
+    from src.data import flipping_augmentation
+    collection = np.stack([gray_sample(seed) for seed in range(32)])[..., np.newaxis]
+    return lambda: flipping_augmentation(collection).numpy()
+
+def unet_forward(batch_size):
+    def setup(directory):
+        import tensorflow as tf
+        from src.config import Default
+        from src.segmentation import build_unet
+        model = build_unet((*Default.image_size, 1), FILTERS)
+        forward = tf.function(lambda x: model(x, training=False))
+        batch = tf.constant(np.random.default_rng(0).random((batch_size, *Default.image_size, 1), dtype=np.float32))
+        return lambda: forward(batch).numpy()
+    return setup
+
+for batch_size in BATCH_SIZES:
+    case(f'segmentation.build_unet[batch={batch_size}]', items=batch_size)(unet_forward(batch_size))
+
+@case('calculator.determinate')
+def determinate(directory):
+    calculator = backend().calculator
+    from app.decoding import open_image
+    image = open_image(jpeg_bytes(pellet_sample(PHOTO_SIZE)[0]))
+    return lambda: calculator.determinate(image, {'remove_small_objects': {}, 'fill_holes': {}})
+
+@case('report_builder.build_report')
+def build_report(directory):
+    backend()
+    from app.report_builder import build_report
+    try:
+        import weasyprint
+    except OSError as error: # bibliotecas do sistema (pango) ausentes
+        raise ImportError(str(error).splitlines()[0]) from error
+    arguments = report_inputs()
+    return lambda: build_report(**arguments)
+
+@case('flask.upload', items=LOAD_REQUESTS)
+def flask_upload(directory):
+    '''
+    `LOAD_REQUESTS` medições simultâneas (`LOAD_THREADS` clientes) de fotos diferentes na rota `/`, com o cache desativado.
+    '''
+    app = backend()
+    app.calculator.CACHE = None # cada rodada repete as mesmas fotos, que seriam respondidas pelo cache
+    photos = [jpeg_bytes(pellet_sample(PHOTO_SIZE, seed=seed)[0]) for seed in range(LOAD_REQUESTS)]
+    post_process = json.dumps({'remove_small_objects': {}, 'fill_holes': {}})
+
+    def upload(photo):
+        response = app.APP.test_client().post('/', data={
+            'image': (BytesIO(photo), 'sample.jpg'),
+            'post_process': post_process,
+            'overlay': json.dumps({'max_size': 1024, 'quality': 85})
+        })
+        assert response.status_code == 200, response.data
+
+    executor = ThreadPoolExecutor(LOAD_THREADS)
+    return lambda: list(executor.map(upload, photos))
@@ -0,0 +1,115 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from collections import namedtuple
+from datetime import datetime
+from fnmatch import fnmatch
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).parent.parent
+
+Case = namedtuple('Case', 'name setup items')
+CASES = {}
+
+def case(name, items=1):
+    '''
+    Registra um caso de benchmark. A função decorada recebe o diretório de trabalho (`pathlib.Path`) e prepara os dados
+    fora da medição, retornando a função, sem argumentos, que será cronometrada; `items` é o número de
+    imagens (ou requisições) processadas a cada chamada.
+    '''
+    def register(setup):
+        CASES[name] = Case(name, setup, items)
+        return setup
+    return register
+
+def timeit(function, repeat, warmup=1, min_time=0.5):
+    # casos rápidos são repetidos até somar `min_time` segundos, para que a mediana seja estável
+    for _ in range(warmup):
+        function()
+    times = []
+    while len(times) < repeat or sum(times) < min_time:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return np.array(times)*1000
+
+def run_case(case, directory, repeat=10, warmup=1):
+    '''
+    Resultado de um caso: estatísticas das durações em milissegundos, `skipped` com o motivo
+    se uma dependência opcional (ex.: WeasyPrint) não estiver disponível, ou `error` se o caso falhar
+    (os demais casos continuam sendo medidos).
+    '''
+    try:
+        function = case.setup(directory)
+        times = timeit(function, repeat, warmup)
+    except ImportError as error:
+        return {'skipped': f'{type(error).__name__}: {error}'}
+    except Exception as error:
+        return {'error': f'{type(error).__name__}: {error}'}
+    return {
+        'repeat': len(times),
+        'mean_ms': times.mean(),
+        'p50_ms': np.percentile(times, 50),
+        'p99_ms': np.percentile(times, 99),
+        'min_ms': times.min(),
+        'per_item_ms': times.mean()/case.items
+    }
+
+def select(patterns=None):
+    return [case for name, case in CASES.items() if not patterns or any(fnmatch(name, pattern) for pattern in patterns)]
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count()
+    }
+
+def run(cases, directory, repeat=10, warmup=1, verbose=True):
+    results = {}
+    for case in cases:
+        results[case.name] = result = run_case(case, directory, repeat, warmup)
+        if verbose:
+            if 'error' in result:
+                status = f'erro ({result["error"]})'
+            elif 'skipped' in result:
+                status = f'ignorado ({result["skipped"]})'
+            else:
+                status = f'{result["p50_ms"]:10.2f} ms'
+            print(f'{case.name:<40} {status}', flush=True)
+    return {'environment': environment(), 'results': results}
+
+def save(report, path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(report, indent=2, default=float))
+
+def load(path):
+    return json.loads(Path(path).read_text())
+
+def compare(report, baseline, tolerance=0.25, stat='p50_ms'):
+    '''
+    Compara cada caso de `report` com o mesmo caso de `baseline` (relatórios de `run`).
+
+    Return:
+        Lista de `(nome, atual, referência, razão, regressão)`, em que `regressão` indica que a razão
+        entre `stat` atual e o de referência é maior que `1 + tolerance`; casos ausentes, ignorados ou com erro em
+        qualquer um dos relatórios não são comparados.
+    '''
+    rows = []
+    for name, result in report['results'].items():
+        reference = baseline['results'].get(name, {})
+        if stat not in result or stat not in reference:
+            continue
+        ratio = result[stat]/reference[stat]
+        rows.append((name, result[stat], reference[stat], ratio, ratio > 1 + tolerance))
+    return rows
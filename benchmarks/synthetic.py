@@ -0,0 +1,62 @@
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Amostras sintéticas no formato do dataset: pellet escuro sobre papel milimetrado (`.jpg`) e máscara binária (`.png`).
+
+def pellet_sample(size=(256, 256), period=8, seed=0):
+    '''
+    Imagem RGB `size` (largura, altura) de um pellet elíptico sobre uma grade de período `period` píxels, e a sua máscara.
+
+    Return:
+        (image, mask): `PIL.Image` RGB e `np.ndarray` booleano [height, width].
+    '''
+    rng = np.random.default_rng(seed)
+    width, height = size
+    y, x = np.mgrid[:height, :width]
+    paper = np.full((height, width), 235.0)
+    paper[(x % period == 0) | (y % period == 0)] = 150 # linhas da grade
+    cx, cy = rng.uniform(0.35, 0.65, 2)*(width, height)
+    ax, ay = rng.uniform(0.15, 0.3, 2)*min(size)
+    angle = rng.uniform(0, np.pi)
+    u = (x - cx)*np.cos(angle) + (y - cy)*np.sin(angle)
+    v = -(x - cx)*np.sin(angle) + (y - cy)*np.cos(angle)
+    mask = (u/ax)**2 + (v/ay)**2 < 1
+    paper[mask] = 60 + 20*rng.random(mask.sum())
+    pixels = np.clip(paper[..., np.newaxis]*(1, 0.97, 0.9) + rng.normal(0, 4, (height, width, 3)), 0, 255)
+    return Image.fromarray(pixels.astype(np.uint8)), mask
+
+def jpeg_bytes(image, quality=92):
+    buffered = BytesIO()
+    image.save(buffered, format='JPEG', quality=quality)
+    return buffered.getvalue()
+
+def write_dataset(directory, n=32, size=(256, 256), seed=0):
+    '''
+    Escreve `n` pares `<i>.jpg`/`<i>.png` em `directory` e retorna a lista de arquivos `.jpg`.
+    '''
+    directory.mkdir(parents=True, exist_ok=True)
+    jpg_files = []
+    for i in range(n):
+        image, mask = pellet_sample(size, seed=seed + i)
+        jpg_file = directory/f'{i}.jpg'
+        image.save(jpg_file, quality=92)
+        Image.fromarray(mask.astype(np.uint8)*255).save(jpg_file.with_suffix('.png'))
+        jpg_files.append(jpg_file)
+    return jpg_files
+
+def report_inputs(n=20, area_label='Área (mm²)', images=4, seed=0):
+    '''
+    Argumentos de `report_builder.build_report` equivalentes aos enviados pelo aplicativo.
+    '''
+    import base64
+    import pandas as pd
+    areas = np.random.default_rng(seed).normal(12, 2, n).round(2)
+    return dict(
+        sample_name= 'benchmark',
+        results= pd.DataFrame({'Id': np.arange(1, n + 1), area_label: areas}),
+        area_label= area_label,
+        summary= pd.DataFrame({'#': ['Média', 'Desvio padrão'], area_label: [areas.mean(), areas.std()]}),
+        images= {str(i): base64.b64encode(jpeg_bytes(pellet_sample((1024, 768), seed=i)[0])).decode() for i in range(images)},
+        comments= []
+    )
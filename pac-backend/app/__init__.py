@@ -1,26 +1,158 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
+import base64
 import json
+import multiprocessing
+import os
+import time
 import pandas as pd
 from io import StringIO
 from .calculator import *
 from .report_builder import *
+from .batch import *
+from .overlay import FORMATS, DEFAULTS, OverlayError, validate_options
+from .postprocess import PostProcessError, get_pipeline
+from .report_jobs import *
+from . import metrics
 
 APP = Flask(__name__)
 
+# os processos de relatórios (report_jobs) também importam este módulo, mas não usam o modelo
+if os.environ.get('PAC_PRELOAD') == '1' and multiprocessing.parent_process() is None:
+    preload()
+
+@APP.before_request
+def start_timing():
+    if metrics.ENABLED:
+        request.started = time.perf_counter()
+        metrics.start_request()
+
+@APP.after_request
+def finish_timing(response):
+    if metrics.ENABLED and hasattr(request, 'started'):
+        endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+        metrics.observe('pac_request_seconds', time.perf_counter() - request.started, endpoint=endpoint)
+        metrics.increment('pac_requests_total', endpoint=endpoint, status=response.status_code)
+        timings = metrics.finish_request()
+        if timings and (metrics.TIMING_HEADERS or request.headers.get('X-PAC-Timing') == '1'):
+            response.headers['Server-Timing'] = metrics.server_timing(timings)
+    return response
+
+@APP.errorhandler(PostProcessError)
+@APP.errorhandler(SegmentationModeError)
+@APP.errorhandler(OverlayError)
+def invalid_request(error):
+    return jsonify({'error': str(error)}), 400
+
+@APP.errorhandler(UploadTooLarge)
+def upload_too_large(error):
+    return jsonify({'error': str(error)}), 413
+
+@APP.errorhandler(ReportsBusy)
+def reports_busy(error):
+    return jsonify({'error': str(error)}), 429, {'Retry-After': '5'}
+
 @APP.route('/', methods=['POST'])
 def upload():
-    return jsonify(determinate(
-        image= get_image(request.files['image']),
-        post_process= json.loads(request.values.get('post_process'))
-    ))
+    overlay = json.loads(request.values.get('overlay', '{}'))
+    validate_options(overlay)
+    data = request.files['image'].read()
+    result = determinate(
+        image= open_image(data),
+        post_process= json.loads(request.values.get('post_process')),
+        overlay= overlay,
+        key= cache_key(data),
+        mode= request.values.get('segmentation')
+    )
+    if isinstance(result['segmentation'], bytes):
+        return Response(result['segmentation'], mimetype=FORMATS[overlay.get('format', DEFAULTS['format'])], headers={
+            'X-PAC-Scale': str(result['scale']),
+            'X-PAC-Area': str(result['area'])
+        })
+    return jsonify(result)
 
-@APP.route('/result', methods=['POST'])
-def report():
-    return jsonify(build_report(
+@APP.route('/batch', methods=['POST'])
+def upload_batch():
+    uploads = list(read_uploads(request.files.getlist('images')))
+    post_process = json.loads(request.values.get('post_process', '{}'))
+    get_pipeline(post_process) # valida antes de iniciar a resposta
+    overlay = json.loads(request.values.get('overlay', '{}'))
+    validate_options(overlay)
+    mode = request.values.get('segmentation')
+    return Response(to_ndjson(measure_all(uploads, post_process, overlay, mode)), mimetype='application/x-ndjson')
+
+@APP.route('/batch/jobs', methods=['POST'])
+def submit_batch_job():
+    post_process = json.loads(request.values.get('post_process', '{}'))
+    get_pipeline(post_process)
+    overlay = json.loads(request.values.get('overlay', '{}'))
+    validate_options(overlay)
+    job_id, total = submit_job(
+        uploads= read_uploads(request.files.getlist('images')),
+        post_process= post_process,
+        overlay= overlay,
+        mode= request.values.get('segmentation')
+    )
+    return jsonify({'job': job_id, 'total': total}), 202
+
+@APP.route('/batch/jobs/<job_id>', methods=['GET'])
+def batch_job(job_id):
+    info = job_status(job_id, offset=request.args.get('offset', 0, type=int))
+    if info is None:
+        return jsonify({'error': f'Trabalho desconhecido: {job_id}'}), 404
+    return jsonify(info)
+
+def report_arguments():
+    return dict(
         sample_name= request.values['sample_name'],
         results= pd.read_json(StringIO(request.values['results'])),
         summary= pd.read_json(StringIO(request.values['summary'])),
         area_label= request.values['area_label'],
         images= json.loads(request.values['images']),
         comments= list(json.loads(request.values['comments']).keys())
-    ))
\ No newline at end of file
+    )
+
+@APP.route('/result', methods=['POST'])
+def report():
+    return jsonify({'report': base64.b64encode(submit_report(**report_arguments()).result()).decode()})
+
+@APP.route('/result/jobs', methods=['POST'])
+def submit_report_request():
+    return jsonify({'job': submit_report_job(**report_arguments())}), 202
+
+@APP.route('/result/jobs/<job_id>', methods=['GET'])
+def report_job(job_id):
+    info = report_status(job_id)
+    if info is None:
+        return jsonify({'error': f'Trabalho desconhecido: {job_id}'}), 404
+    return jsonify(info)
+
+@APP.route('/result/jobs/<job_id>/pdf', methods=['GET'])
+def report_pdf(job_id):
+    info = report_status(job_id)
+    if info is None or info['status'] != 'done':
+        return jsonify(info or {'error': f'Trabalho desconhecido: {job_id}'}), (404 if info is None else 409)
+    return send_file(report_path(job_id), mimetype='application/pdf', download_name=f'{job_id}.pdf')
+
+@APP.route('/batching', methods=['GET'])
+def batching_stats():
+    return jsonify(batcher_stats())
+
+@APP.route('/cache', methods=['GET'])
+def cache_info():
+    return jsonify(cache_stats())
+
+@APP.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    batching = batcher_stats()
+    gauges = [
+        *((f'pac_batcher_{name}', batching[name], {}) for name in ('requests', 'batches', 'mean_batch_size') if name in batching),
+        *(('pac_batcher_queue_wait_ms', value, {'quantile': name[1:]}) for name, value in batching.get('queue_wait_ms', {}).items()),
+        *((f'pac_cache_{name}', value, {}) for name, value in cache_stats().items() if isinstance(value, (int, float))),
+        ('pac_model_warm', int(status()['warm']), {})
+    ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@APP.route('/health', methods=['GET'])
+def health():
+    info = status()
+    return jsonify(info), (200 if info['warm'] else 503)
\ No newline at end of file
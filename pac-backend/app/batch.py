@@ -0,0 +1,126 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from pathlib import Path
+from .calculator import cache_key, determinate, open_image
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png'}
+BATCH_WORKERS = int(os.environ.get('PAC_BATCH_WORKERS', 8))
+JOBS_DIR = Path(os.environ.get('PAC_JOBS_DIR', Path(tempfile.gettempdir())/'pac-jobs'))
+JOB_TTL = float(os.environ.get('PAC_JOB_TTL', 3600))
+JOB_STALE_TIMEOUT = float(os.environ.get('PAC_JOB_STALE_TIMEOUT', 300))
+ZIP_MAX_ENTRIES = int(os.environ.get('PAC_ZIP_MAX_ENTRIES', 1000))
+ZIP_MAX_MB = float(os.environ.get('PAC_ZIP_MAX_MB', 512))
+EXECUTOR = ThreadPoolExecutor(BATCH_WORKERS)
+
+class UploadTooLarge(ValueError):
+    pass
+
+def read_uploads(files):
+    '''
+    Conteúdo (nome, bytes) de cada imagem enviada; arquivos `.zip` são expandidos.
+
+    Os arquivos `.zip` são verificados antes da extração: `UploadTooLarge` se tiverem mais de `PAC_ZIP_MAX_ENTRIES` imagens
+    ou se as imagens somarem mais de `PAC_ZIP_MAX_MB` megabytes descompactadas.
+    '''
+    for file in files:
+        data = file.read()
+        if zipfile.is_zipfile(BytesIO(data)):
+            with zipfile.ZipFile(BytesIO(data)) as archive:
+                infos = [
+                    info for info in archive.infolist()
+                    if not info.is_dir() and Path(info.filename).suffix.lower() in IMAGE_SUFFIXES
+                ]
+                if len(infos) > ZIP_MAX_ENTRIES:
+                    raise UploadTooLarge(f'{file.filename}: mais de {ZIP_MAX_ENTRIES} imagens no arquivo .zip')
+                # `file_size` também limita a leitura: o zipfile não descompacta além do tamanho declarado
+                if sum(info.file_size for info in infos) > ZIP_MAX_MB*2**20:
+                    raise UploadTooLarge(f'{file.filename}: as imagens descompactadas excedem {ZIP_MAX_MB:g} MB')
+                for info in infos:
+                    yield info.filename, archive.read(info)
+        else:
+            yield file.filename, data
+
+def measure(name, data, post_process, overlay=None, mode=None):
+    # as respostas são JSON, então a sobreposição é sempre codificada em base64
+    overlay = {**(overlay or {}), 'encoding': 'base64'}
+    try:
+        return {'name': name, **determinate(open_image(data), post_process, overlay, cache_key(data), mode)}
+    except Exception as error:
+        return {'name': name, 'error': str(error)}
+
+def measure_all(uploads, post_process, overlay=None, mode=None):
+    '''
+    Mede as imagens concorrentemente (as predições são agrupadas em lotes pelo `MicroBatcher`)
+    e produz os resultados na ordem em que ficam prontos.
+    '''
+    futures = [EXECUTOR.submit(measure, name, data, post_process, overlay, mode) for name, data in uploads]
+    for future in as_completed(futures):
+        yield future.result()
+
+def to_ndjson(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
+
+def remove_expired_jobs():
+    for path in JOBS_DIR.glob('*'):
+        try: # outro worker pode ter removido o arquivo depois da listagem
+            expired = time.time() - path.stat().st_mtime > JOB_TTL
+        except FileNotFoundError:
+            continue
+        if expired:
+            path.unlink(missing_ok=True)
+
+def submit_job(uploads, post_process, overlay=None, mode=None):
+    '''
+    Inicia a medição em segundo plano; os resultados são gravados em `JOBS_DIR`,
+    de modo que podem ser consultados por qualquer worker.
+    '''
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    remove_expired_jobs()
+    job_id = uuid.uuid4().hex
+    uploads = list(uploads)
+    (JOBS_DIR/f'{job_id}.json').write_text(json.dumps({'total': len(uploads)}))
+    results_path = JOBS_DIR/f'{job_id}.ndjson'
+    results_path.touch()
+
+    def run():
+        try:
+            with open(results_path, 'a') as file:
+                for line in to_ndjson(measure_all(uploads, post_process, overlay, mode)):
+                    file.write(line)
+                    file.flush()
+        except Exception as error:
+            (JOBS_DIR/f'{job_id}.error').write_text(str(error) or type(error).__name__)
+
+    threading.Thread(target=run, daemon=True).start()
+    return job_id, len(uploads)
+
+def job_status(job_id, offset=0):
+    '''
+    Progresso do trabalho `job_id` e os resultados a partir do índice `offset`, ou `None` se o trabalho não existir.
+
+    O estado (`status`) é `running`, `done` ou `failed`: o trabalho falhou se a sua thread terminou com um erro, ou se
+    nenhum resultado foi gravado há mais de `PAC_JOB_STALE_TIMEOUT` segundos (o worker que o executava foi encerrado).
+    '''
+    if not re.fullmatch('[0-9a-f]{32}', job_id) or not (JOBS_DIR/f'{job_id}.json').exists():
+        return None
+    total = json.loads((JOBS_DIR/f'{job_id}.json').read_text())['total']
+    results_path = JOBS_DIR/f'{job_id}.ndjson'
+    lines = results_path.read_text().split('\n')[:-1] # a última linha pode estar incompleta
+    info = {'job': job_id, 'total': total, 'done': len(lines), 'status': 'running'}
+    error = JOBS_DIR/f'{job_id}.error'
+    if len(lines) == total:
+        info['status'] = 'done'
+    elif error.exists():
+        info.update(status='failed', error=error.read_text())
+    elif time.time() - results_path.stat().st_mtime > JOB_STALE_TIMEOUT:
+        info.update(status='failed', error='O trabalho foi interrompido.')
+    return {**info, 'finished': info['status'] != 'running', 'results': [json.loads(line) for line in lines[offset:]]}
@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from queue import Queue, Empty
+import numpy as np
+
+class MicroBatcher:
+    '''
+    Agrupa chamadas concorrentes de `predict` em um único lote.
+
+    Cada chamada entra em uma fila; uma thread dedicada coleta até `max_batch_size` entradas,
+    ou aguarda no máximo `timeout_ms` milissegundos após a primeira, executa `predict` uma vez
+    sobre o lote empilhado e devolve a cada chamada a sua fatia do resultado.
+    '''
+    def __init__(self, predict, max_batch_size=8, timeout_ms=5, window=1024):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout_ms/1000
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._batch_sizes = Counter()
+        self._waits = deque(maxlen=window)
+        self._n_requests = 0
+
+    def _ensure_worker(self):
+        # a thread é criada sob demanda (e recriada após um fork), para que o processo mestre do gunicorn não a herde
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = Queue()
+                threading.Thread(target=self._worker, daemon=True).start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.timeout
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0: break
+            try: batch.append(self._queue.get(timeout=remaining))
+            except Empty: break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            try:
+                outputs = self.predict(np.stack([x for x, _, _ in batch]))
+            except Exception as error:
+                for _, future, _ in batch: future.set_exception(error)
+                continue
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._n_requests += len(batch)
+                self._waits.extend(start - queued for _, _, queued in batch)
+            if isinstance(outputs, (list, tuple)): # modelos com várias saídas
+                outputs = zip(*outputs)
+            for output, (_, future, _) in zip(outputs, batch):
+                future.set_result(output)
+
+    def submit(self, x):
+        '''
+        Enfileira uma entrada (sem o eixo do lote) e retorna um `Future` com a sua saída.
+        '''
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((x, future, time.perf_counter()))
+        return future
+
+    def __call__(self, x):
+        return self.submit(x).result()
+
+    def stats(self):
+        with self._lock:
+            waits = np.array(self._waits)*1000
+            n_batches = sum(self._batch_sizes.values())
+            return {
+                'max_batch_size': self.max_batch_size,
+                'timeout_ms': self.timeout*1000,
+                'requests': self._n_requests,
+                'batches': n_batches,
+                'mean_batch_size': self._n_requests/n_batches if n_batches else 0,
+                'batch_sizes': {str(size): count for size, count in sorted(self._batch_sizes.items())},
+                'queue_wait_ms': {
+                    f'p{q}': float(np.percentile(waits, q)) if len(waits) else 0
+                    for q in (50, 90, 99)
+                }
+            }
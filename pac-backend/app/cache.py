@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from hashlib import sha1
+import numpy as np
+
+def content_hash(data):
+    return sha1(data).hexdigest()
+
+class ResultCache:
+    '''
+    Cache das saídas caras de `determinate` (mapa de probabilidades da U-Net, escala e, no modo 'roi', a posição do mapa
+    na imagem; ver `calculator.segment`), indexado pelo hash do conteúdo da imagem.
+
+    Os resultados mais recentes ficam em memória (LRU com até `max_items` entradas, somando até `max_memory_bytes`
+    bytes de probabilidades); se `path` for informado,
+    também são gravados em um banco SQLite, compartilhado entre os workers e entre reinícios, cujo tamanho é
+    limitado a `max_bytes` removendo primeiro os resultados acessados há mais tempo.
+    '''
+    def __init__(self, max_items=128, path=None, max_bytes=1 << 30, max_memory_bytes=1 << 28):
+        self.max_items = max_items
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._items = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        if path is not None:
+            with self._connect() as db:
+                columns = {row[1] for row in db.execute('PRAGMA table_info(results)')}
+                if columns and 'region' not in columns: # cache de uma versão anterior: é refeito
+                    db.execute('DROP TABLE results')
+                db.execute('''
+                    CREATE TABLE IF NOT EXISTS results (
+                        key TEXT PRIMARY KEY, scale REAL, height INTEGER, width INTEGER,
+                        probabilities BLOB, region TEXT, size INTEGER, accessed REAL
+                    )
+                ''')
+                db.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db: yield db # confirma a transação ao final do bloco
+        finally:
+            db.close()
+
+    def _remember(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self._memory_bytes -= self._items[key][0].nbytes
+            self._items[key] = value
+            self._items.move_to_end(key)
+            self._memory_bytes += value[0].nbytes
+            while self._items and (len(self._items) > self.max_items or self._memory_bytes > self.max_memory_bytes):
+                _, (probabilities, *_) = self._items.popitem(last=False)
+                self._memory_bytes -= probabilities.nbytes
+
+    def get(self, key):
+        '''
+        `(probabilidades, escala, região)` de `key`, ou `None` se não estiver no cache.
+        '''
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self._counts['memory_hits'] += 1
+                return self._items[key]
+        value = self._load(key) if self.path is not None else None
+        with self._lock:
+            self._counts['disk_hits' if value is not None else 'misses'] += 1
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def put(self, key, probabilities, scale, region=None):
+        probabilities = np.array(probabilities, np.float32) # cópia: a predição pode ser uma fatia do lote inteiro
+        probabilities.setflags(write=False)
+        value = (probabilities, float(scale), None if region is None else tuple(int(value) for value in region))
+        self._remember(key, value)
+        if self.path is not None:
+            self._store(key, *value)
+        return value
+
+    def _load(self, key):
+        with self._connect() as db:
+            row = db.execute('SELECT scale, height, width, probabilities, region FROM results WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        scale, height, width, content, region = row
+        probabilities = np.frombuffer(content, np.float32).reshape(height, width)
+        return probabilities, scale, None if region is None else tuple(json.loads(region))
+
+    def _store(self, key, probabilities, scale, region):
+        content = probabilities.tobytes()
+        with self._connect() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, scale, *probabilities.shape, content, None if region is None else json.dumps(region), len(content), time.time())
+            )
+            total, = db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()
+            if total > self.max_bytes:
+                # remove os mais antigos até liberar o excesso
+                excess = total - self.max_bytes
+                removed = 0
+                for old_key, size in db.execute('SELECT key, size FROM results ORDER BY accessed').fetchall():
+                    if removed >= excess: break
+                    db.execute('DELETE FROM results WHERE key = ?', (old_key,))
+                    removed += size
+                    with self._lock: self._counts['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+            memory_items = len(self._items)
+            memory_bytes = self._memory_bytes
+        requests = sum(counts.get(name, 0) for name in ('memory_hits', 'disk_hits', 'misses'))
+        hits = counts.get('memory_hits', 0) + counts.get('disk_hits', 0)
+        info = {
+            'memory_hits': counts.get('memory_hits', 0),
+            'disk_hits': counts.get('disk_hits', 0),
+            'misses': counts.get('misses', 0),
+            'hit_rate': hits/requests if requests else 0,
+            'memory_items': memory_items,
+            'max_items': self.max_items,
+            'memory_bytes': memory_bytes,
+            'max_memory_bytes': self.max_memory_bytes
+        }
+        if self.path is not None:
+            with self._connect() as db:
+                disk_items, disk_bytes = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results').fetchone()
+            info.update(disk_items=disk_items, disk_bytes=disk_bytes, max_bytes=self.max_bytes, evictions=counts.get('evictions', 0))
+        return info
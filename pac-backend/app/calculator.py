@@ -1,19 +1,190 @@
 import numpy as np
 from skimage.color import rgb2gray
 from skimage.transform import resize
-from skimage import morphology
-from skimage.segmentation import mark_boundaries
 from scipy import ndimage
-from scipy.stats import mode
-from tensorflow.keras.saving import load_model
 from pathlib import Path
-import base64
 from io import BytesIO
 from PIL import Image
+import os
+import threading
+import h5py
+from .batching import MicroBatcher
+from .overlay import build_overlay, preview_size
+from .cache import ResultCache, content_hash
+from .postprocess import get_pipeline
+from .metrics import stage
+from .decoding import decode_reduced, open_image
+from .tiling import SegmentationModeError, merge_tiles, roi_box, split_tiles
 
 HERE = Path(__file__).parent
-MODEL = load_model(HERE/'unet-0.41.h5', compile=False)
+MODEL_PATH = HERE/'unet-0.41.h5'
 IMG_SIZE = (256, 256)
+INFERENCE_ENGINE = os.environ.get('PAC_INFERENCE_ENGINE', 'function')
+TFLITE_PATH = os.environ.get('PAC_TFLITE_MODEL')
+FUSED = os.environ.get('PAC_FUSED') == '1'
+CALIBRATION_DIR = os.environ.get('PAC_CALIBRATION_DIR')
+BATCH_SIZE = int(os.environ.get('PAC_BATCH_SIZE', 8))
+BATCH_TIMEOUT_MS = float(os.environ.get('PAC_BATCH_TIMEOUT_MS', 5))
+CACHE_SIZE = int(os.environ.get('PAC_CACHE_SIZE', 128))
+CACHE_DB = os.environ.get('PAC_CACHE_DB')
+CACHE_DB_MAX_MB = float(os.environ.get('PAC_CACHE_DB_MAX_MB', 1024))
+CACHE_MEMORY_MB = float(os.environ.get('PAC_CACHE_MEMORY_MB', 256))
+SEGMENTATION_MODES = ('resize', 'tiled', 'roi')
+SEGMENTATION = os.environ.get('PAC_SEGMENTATION', 'resize')
+TILE_RESOLUTION = int(os.environ.get('PAC_TILE_RESOLUTION', 1024))
+TILE_OVERLAP = int(os.environ.get('PAC_TILE_OVERLAP', 64))
+ROI_MARGIN = float(os.environ.get('PAC_ROI_MARGIN', 0.25))
+# a decodificação reduzida (modo draft) mantém pelo menos DRAFT_OVERSAMPLING vezes IMG_SIZE, e a redução final
+# continua sendo feita por skimage.transform.resize (com anti-aliasing), como no treinamento
+DRAFT_OVERSAMPLING = int(os.environ.get('PAC_DRAFT_OVERSAMPLING', 2))
+
+# o TensorFlow e a U-Net só são carregados quando necessários (ver get_model e get_batcher)
+MODEL = None
+MODEL_BYTES = None
+BATCHER = None
+WARM = False
+CACHE = ResultCache(CACHE_SIZE, CACHE_DB, int(CACHE_DB_MAX_MB*2**20), int(CACHE_MEMORY_MB*2**20)) if CACHE_SIZE or CACHE_DB else None
+_LOCK = threading.RLock()
+
+def preprocess(image):
+    with stage('decode'):
+        pixels = np.asarray(decode_reduced(image, tuple(DRAFT_OVERSAMPLING*side for side in IMG_SIZE[::-1])))
+    with stage('resize'):
+        pixels = resize(pixels, IMG_SIZE)
+    with stage('grayscale'):
+        return rgb2gray(pixels)
+
+def calibration_data(directory):
+    for path in sorted(Path(directory).glob('*.jpg')):
+        yield preprocess(Image.open(path))[..., np.newaxis]
+
+def uses_tflite_file():
+    return INFERENCE_ENGINE.startswith('tflite') and TFLITE_PATH is not None
+
+def preload():
+    '''
+    Carregamento antecipado para o processo mestre do gunicorn (`--preload`).
+
+    Apenas importa o TensorFlow e lê o modelo (H5, ou `.tflite` se `PAC_TFLITE_MODEL` estiver definido) para a memória,
+    que é então compartilhada pelos workers via copy-on-write. Nenhuma operação do TensorFlow é executada aqui:
+    o runtime do TensorFlow não sobrevive a um fork, e os workers travariam na primeira predição.
+    '''
+    global MODEL_BYTES
+    import tensorflow
+    from . import engines
+    with _LOCK:
+        if MODEL_BYTES is None:
+            MODEL_BYTES = Path(TFLITE_PATH if uses_tflite_file() else MODEL_PATH).read_bytes()
+
+def get_model():
+    global MODEL
+    with _LOCK:
+        if MODEL is None:
+            from tensorflow.keras.saving import load_model
+            MODEL = load_model(h5py.File(BytesIO(MODEL_BYTES), 'r') if MODEL_BYTES else MODEL_PATH, compile=False)
+        return MODEL
+
+def get_batcher():
+    global BATCHER
+    with _LOCK:
+        if BATCHER is None:
+            from .engines import build_engine
+            options = {}
+            if INFERENCE_ENGINE == 'tflite-int8' and CALIBRATION_DIR:
+                options['calibration'] = list(calibration_data(CALIBRATION_DIR))
+            if FUSED:
+                if INFERENCE_ENGINE not in ('function', 'keras'):
+                    raise ValueError('O modelo combinado (PAC_FUSED) requer PAC_INFERENCE_ENGINE igual a "function" ou "keras".')
+                from .fused import build_pac_model
+                engine = build_engine(INFERENCE_ENGINE, build_pac_model(get_model()))
+            elif uses_tflite_file():
+                engine = build_engine('tflite', MODEL_BYTES or TFLITE_PATH)
+            else:
+                engine = build_engine(INFERENCE_ENGINE, get_model(), **options)
+            BATCHER = MicroBatcher(engine, max_batch_size=BATCH_SIZE, timeout_ms=BATCH_TIMEOUT_MS)
+        return BATCHER
+
+def predict(gray_image):
+    '''
+    Mapa de probabilidades da U-Net, ou (probabilidades, área em píxels, escala) se `FUSED`.
+    '''
+    global WARM
+    output = get_batcher()(gray_image[..., np.newaxis].astype(np.float32))
+    WARM = True
+    if FUSED:
+        mask, area, scale = output
+        return mask[..., 0], float(area), float(scale)
+    return output[..., 0]
+
+def predict_many(gray_images):
+    '''
+    Mapas de probabilidades de várias entradas [height, width], enviadas juntas ao `MicroBatcher`.
+    '''
+    global WARM
+    batcher = get_batcher()
+    futures = [batcher.submit(x[..., np.newaxis].astype(np.float32)) for x in gray_images]
+    outputs = [future.result() for future in futures]
+    WARM = True
+    return np.stack([(output[0] if FUSED else output)[..., 0] for output in outputs])
+
+def to_gray(image, size):
+    # redução com o PIL (uint8), bem mais barata que skimage.transform.resize para fotos grandes
+    return rgb2gray(np.asarray(decode_reduced(image, size).resize(size, Image.BILINEAR, reducing_gap=2)))
+
+def predict_tiled(image):
+    '''
+    Probabilidades de `image` reduzida para `PAC_TILE_RESOLUTION` píxels no maior lado, calculadas em blocos
+    sobrepostos do tamanho de entrada da U-Net.
+    '''
+    gray_image = to_gray(image, preview_size(image.size, TILE_RESOLUTION))
+    tiles, positions = split_tiles(gray_image, IMG_SIZE[0], TILE_OVERLAP)
+    return merge_tiles(predict_many(tiles), positions, gray_image.shape, TILE_OVERLAP)
+
+def predict_roi(image, coarse):
+    '''
+    Refina a predição `coarse` (na resolução do modelo): segmenta novamente apenas a região em volta do pellet,
+    recortada da imagem original.
+
+    Returns:
+        `(probabilities, region)`: probabilidades apenas da região, na resolução em que ela tem `IMG_SIZE` píxels,
+        e `region = (top, left, height, width)`, a posição da região no mapa da imagem inteira `[height, width]`
+        nessa mesma resolução (fora da região as probabilidades são nulas); `region = None` se `coarse` estiver vazia.
+    '''
+    box = roi_box(coarse > 0.5, ROI_MARGIN)
+    if box is None:
+        return coarse, None
+    top, left, bottom, right = box
+    width, height = image.size
+    ry, rx = height/IMG_SIZE[0], width/IMG_SIZE[1]
+    crop = image.crop((round(left*rx), round(top*ry), round(right*rx), round(bottom*ry)))
+    fine = predict_many([to_gray(crop, IMG_SIZE[::-1])])[0]
+
+    # a região mantém os seus píxels, sem ultrapassar a resolução original da imagem
+    shape = (
+        min(height, round(IMG_SIZE[0]*IMG_SIZE[0]/(bottom - top))),
+        min(width, round(IMG_SIZE[1]*IMG_SIZE[1]/(right - left)))
+    )
+    sy, sx = shape[0]/IMG_SIZE[0], shape[1]/IMG_SIZE[1]
+    y0, y1, x0, x1 = round(top*sy), round(bottom*sy), round(left*sx), round(right*sx)
+    return resize(fine, (y1 - y0, x1 - x0), order=1).astype(np.float32), (y0, x0, *shape)
+
+def warmup():
+    '''
+    Carrega a U-Net, cria o mecanismo de inferência e executa uma predição, para que a primeira requisição não pague estes custos.
+    '''
+    predict(np.zeros(IMG_SIZE, np.float32))
+
+def status():
+    return {
+        'engine': INFERENCE_ENGINE,
+        'model_loaded': MODEL is not None,
+        'warm': WARM
+    }
+
+def batcher_stats():
+    return BATCHER.stats() if BATCHER is not None else {}
+
+# medição da escala: cópia de src/measure.py (o backend é empacotado sem src/), conferida por tests/test_backend_measure.py
 
 def FFT(x):
     return np.abs(np.fft.fft(x))
@@ -24,47 +195,96 @@ def Cxx(x):
 def PSD(x):
     return FFT(Cxx(x))
 
-def find_scale(img, sigma=2):
-    Iy, Ix = np.gradient(img)
-    fs= []
-    for dI in (Ix, Iy.T):
-        freqs = np.fft.fftfreq(dI.shape[1], 1)
+def PSD_batch(x):
+    W = x.shape[-1]
+    L = 1 << int(np.ceil(np.log2(2*W - 1)))
+    F = np.fft.rfft(x, n=L, axis=-1)
+    acf = np.fft.irfft(F.real**2 + F.imag**2, n=L, axis=-1)
+    lags = np.arange(W) + (W - 1)//2 - (W - 1)
+    return np.abs(np.fft.rfft(acf[..., lags%L], axis=-1))
+
+def bulk_mode(D, n_bins):
+    offsets = np.arange(D.shape[0])[:, np.newaxis]*n_bins
+    counts = np.bincount((D + offsets).ravel(), minlength=D.shape[0]*n_bins)
+    return np.argmax(counts.reshape(D.shape[0], n_bins), axis=-1)
+
+def find_scale_batch(imgs, sigma=2):
+    Iy, Ix = np.gradient(np.asarray(imgs), axis=(1, 2))
+    fs = []
+    for dI in (Ix, Iy.transpose(0, 2, 1)):
+        freqs = np.fft.fftfreq(dI.shape[-1], 1)
         pos = freqs > 0
-        dI_gauss = ndimage.gaussian_filter(dI, sigma)
-        D = np.apply_along_axis(lambda y: freqs[pos][np.argmax(PSD(y)[pos])], 1, dI_gauss)
-        fs.append(mode(D, keepdims=True).mode[0])
+        dI_gauss = ndimage.gaussian_filter(dI, (0, sigma, sigma))
+        D = np.argmax(PSD_batch(dI_gauss)[..., 1:pos.sum() + 1], axis=-1)
+        fs.append(freqs[pos][bulk_mode(D, pos.sum())])
     
     fx, fy = fs
     return fx*fy
 
-def get_image(image_file):
-    buffered = BytesIO()
-    image_file.save(buffered)
-    return Image.open(buffered)
+def find_scale(img, sigma=2):
+    return find_scale_batch(np.asarray(img)[np.newaxis], sigma)[0]
+
+def cache_key(data):
+    # as probabilidades dependem também do modelo e do mecanismo de inferência
+    return f'{MODEL_PATH.name}:{INFERENCE_ENGINE}:{content_hash(data)}'
 
-def image_to_base64(image):
-    buffered = BytesIO()
-    image.save(buffered, format='JPEG', quality=95)
-    return base64.b64encode(buffered.getvalue()).decode()
+def segment(image, key=None, mode=None):
+    '''
+    Mapa de probabilidades da U-Net, escala e região de `image` (`(probabilities, scale, region)`), reaproveitados do cache
+    quando a mesma imagem (`key`, ver `cache_key`) já foi medida.
 
-def build_overlay(mask, image):
-    label = Image.fromarray((120*mask).astype(np.uint8)).convert('L')
-    overlay = Image.composite(Image.new('RGB', image.size, (50, 200, 255)), image, label)
-    return image_to_base64(Image.fromarray((mark_boundaries(np.array(overlay), mask, (1, 1, 0))*255).astype(np.uint8)))
+    Em `mode='resize'` a imagem é reduzida para `IMG_SIZE`; em `'tiled'` e `'roi'` (ver `predict_tiled` e `predict_roi`)
+    o mapa de probabilidades tem resolução maior, e a escala continua se referindo a um píxel de `IMG_SIZE`.
+    `region` é `None` se o mapa cobre a imagem inteira; no modo `'roi'` o mapa cobre apenas a região em volta do pellet
+    (ver `predict_roi`).
+    '''
+    mode = mode or SEGMENTATION
+    if mode not in SEGMENTATION_MODES:
+        raise SegmentationModeError(f'Modo de segmentação desconhecido: {mode} (opções: {", ".join(SEGMENTATION_MODES)})')
+    if key is not None:
+        key = f'{mode}:{key}'
+    if CACHE is not None and key is not None:
+        with stage('cache'):
+            cached = CACHE.get(key)
+        if cached is not None:
+            return cached
+    gray_image = preprocess(image)
+    region = None
+    if FUSED:
+        with stage('predict'):
+            pred, _, scale = predict(gray_image)
+    else:
+        with stage('find_scale'):
+            scale = find_scale(gray_image)
+        if mode != 'tiled': # no modo 'tiled' a predição em IMG_SIZE não é usada
+            with stage('predict'):
+                pred = predict(gray_image)
+    if mode == 'tiled':
+        with stage('predict_tiled'):
+            pred = predict_tiled(image)
+    elif mode == 'roi':
+        with stage('predict_roi'):
+            pred, region = predict_roi(image, pred)
+    if CACHE is not None and key is not None:
+        return CACHE.put(key, pred, scale, region)
+    return pred, scale, region
 
-def determinate(image, post_process):
-    gray_image = rgb2gray(resize(np.array(image), IMG_SIZE))
-    scale = find_scale(gray_image)
-    pred = MODEL.predict(gray_image[np.newaxis, ..., np.newaxis], verbose=False)[0, ..., 0]
-    pred = pred > 0.5
+def cache_stats():
+    return CACHE.stats() if CACHE is not None else {'enabled': False}
 
-    for func, config in post_process.items():
-        pred = getattr(globals()[config['source']], func)(pred, **config['params'])
+def determinate(image, post_process, overlay=None, key=None, mode=None):
+    pred, scale, region = segment(image, key, mode)
+    # quantos píxels de IMG_SIZE cada píxel da predição representa (1 no modo 'resize')
+    pixel_ratio = np.prod(IMG_SIZE)/np.prod(pred.shape if region is None else region[2:])
+    # no modo 'roi' apenas a região é processada: fora dela a máscara é vazia
+    with stage('post_process'):
+        pred = get_pipeline(post_process, resolution=1/np.sqrt(pixel_ratio))(pred > 0.5)
 
-    segmentation = resize(pred, image.size)
+    with stage('overlay'):
+        segmentation = build_overlay(pred, image, region, **(overlay or {}))
 
     return {
         'scale': scale,
-        'area': scale*pred.sum(),
-        'segmentation': build_overlay(segmentation, image)
+        'area': scale*pixel_ratio*pred.sum(),
+        'segmentation': segmentation
     }
\ No newline at end of file
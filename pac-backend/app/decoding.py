@@ -0,0 +1,20 @@
+from io import BytesIO
+from PIL import Image
+
+def open_image(data):
+    return Image.open(BytesIO(data))
+
+def decode_reduced(image, size):
+    '''
+    `image` em RGB com pelo menos `size` (largura, altura) píxels.
+
+    JPEGs ainda não carregados são decodificados já reduzidos em 1/2, 1/4 ou 1/8 (modo draft do PIL, que escala
+    os coeficientes DCT durante a decodificação), a partir de uma segunda leitura do mesmo conteúdo: `image`
+    continua intacta, e só é decodificada em resolução máxima se a sobreposição precisar dela.
+    '''
+    source = getattr(image, 'fp', None)
+    if image.format == 'JPEG' and source is not None:
+        reduced = Image.open(BytesIO(source.getvalue()) if hasattr(source, 'getvalue') else image.filename)
+        reduced.draft('RGB', size)
+        return reduced.convert('RGB')
+    return image.convert('RGB')
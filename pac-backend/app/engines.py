@@ -0,0 +1,92 @@
+import numpy as np
+import tensorflow as tf
+
+class KerasEngine:
+    '''
+    Inferência através de `Model.predict` (laço completo do Keras).
+    '''
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, batch):
+        return self.model.predict(batch, batch_size=len(batch), verbose=False)
+
+class FunctionEngine:
+    '''
+    Inferência através de uma chamada direta ao modelo compilada com `tf.function`,
+    sem o pipeline `tf.data` e os callbacks criados por `Model.predict` a cada chamada.
+    '''
+    def __init__(self, model, jit_compile=False):
+        self.model = model
+        self._call = tf.function(
+            lambda x: model(x, training=False),
+            input_signature= [tf.TensorSpec([None, *model.input_shape[1:]], tf.float32)],
+            jit_compile= jit_compile
+        )
+
+    def __call__(self, batch):
+        return tf.nest.map_structure(lambda output: output.numpy(), self._call(tf.convert_to_tensor(batch, tf.float32)))
+
+class TFLiteEngine:
+    '''
+    Inferência através do interpretador TFLite.
+
+    Args:
+        model: Modelo Keras que será convertido, conteúdo (`bytes`) ou caminho de um arquivo `.tflite` já convertido.
+        quantization (opcional): `None`, `'dynamic'` (pesos em int8) ou `'int8'` (pesos e ativações em int8).
+        calibration (opcional): Iterável de entradas `[height, width, channels]` usado para calibrar a quantização `'int8'`.
+        num_threads (opcional): Número de threads do interpretador.
+    '''
+    def __init__(self, model, quantization=None, calibration=None, num_threads=None):
+        if isinstance(model, tf.keras.Model):
+            model = self.convert(model, quantization, calibration)
+        elif not isinstance(model, bytes):
+            with open(model, 'rb') as file: model = file.read()
+        self.content = model
+        self.interpreter = tf.lite.Interpreter(model_content=model, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]['index']
+        self._output = self.interpreter.get_output_details()[0]['index']
+        self._batch_size = None
+
+    @staticmethod
+    def convert(model, quantization=None, calibration=None):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if quantization is not None:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantization == 'int8':
+            if calibration is None:
+                raise ValueError('A quantização int8 requer dados de calibração.')
+            converter.representative_dataset = lambda: (
+                [np.asarray(x, np.float32)[np.newaxis]] for x in calibration
+            )
+        elif quantization not in (None, 'dynamic'):
+            raise ValueError(f'Quantização desconhecida: {quantization}')
+        return converter.convert()
+
+    def save(self, path):
+        with open(path, 'wb') as file: file.write(self.content)
+
+    def __call__(self, batch):
+        if len(batch) != self._batch_size:
+            self._batch_size = len(batch)
+            self.interpreter.resize_tensor_input(self._input, [self._batch_size, *np.shape(batch)[1:]])
+            self.interpreter.allocate_tensors()
+        self.interpreter.set_tensor(self._input, np.asarray(batch, np.float32))
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output)
+
+ENGINES = {
+    'keras': KerasEngine,
+    'function': FunctionEngine,
+    'tflite': TFLiteEngine,
+    'tflite-dynamic': lambda model, **kwargs: TFLiteEngine(model, quantization='dynamic', **kwargs),
+    'tflite-int8': lambda model, **kwargs: TFLiteEngine(model, quantization='int8', **kwargs),
+}
+
+def build_engine(name, model, **kwargs):
+    '''
+    Cria o mecanismo de inferência `name` (uma das chaves de `ENGINES`) para `model`.
+    '''
+    if name not in ENGINES:
+        raise ValueError(f'Mecanismo de inferência desconhecido: {name} (opções: {", ".join(ENGINES)})')
+    return ENGINES[name](model, **kwargs)
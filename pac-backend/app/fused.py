@@ -0,0 +1,80 @@
+import numpy as np
+import tensorflow as tf
+from scipy.ndimage import gaussian_filter
+from tensorflow.keras import Input, Model, layers
+
+# Versão em grafo de calculator.find_scale (cópia de src/measure.py: ScaleMeasurer), para que a segmentação,
+# a área e a escala sejam calculadas em uma única chamada ao modelo. A equivalência com src/measure.py é conferida
+# por tests/test_backend_measure.py.
+
+def scale_operators(size, sigma):
+    eye = np.eye(size)
+    derivative = np.gradient(eye, axis=1)
+    blur = gaussian_filter(eye, (0, sigma))
+
+    L = 1 << int(np.ceil(np.log2(2*size - 1)))
+    k = np.arange(L//2 + 1)
+    phase = 2*np.pi*np.outer(np.arange(size), k)/L
+    dft_cos, dft_sin = np.cos(phase), np.sin(phase)
+
+    lags = np.arange(size) + (size - 1)//2 - (size - 1)
+    weights = np.where((k == 0) | (k == L//2), 1, 2)
+    inverse = weights[:, np.newaxis]*np.cos(2*np.pi*np.outer(k, lags)/L)/L
+
+    q = np.arange(1, (size + 1)//2)
+    phase = 2*np.pi*np.outer(np.arange(size), q)/size
+    return derivative, blur, dft_cos, dft_sin, inverse @ np.cos(phase), inverse @ np.sin(phase)
+
+def mode_index(indices, depth):
+    counts = tf.reduce_sum(tf.one_hot(indices, depth, dtype=tf.int32), axis=-2)
+    return tf.argmax(counts*depth - tf.range(depth), axis=-1, output_type=tf.int32)
+
+class ScaleMeasurer(layers.Layer):
+    def __init__(self, sigma=2, **kwargs):
+        super().__init__(**kwargs)
+        self.sigma = sigma
+
+    def build(self, input_shape):
+        h, w = input_shape[1:3]
+        const = lambda x: tf.constant(x, dtype=self.compute_dtype)
+        dh, bh, ch, sh, pch, psh = scale_operators(h, self.sigma)
+        dw, bw, cw, sw, pcw, psw = scale_operators(w, self.sigma)
+        self.x_left, self.x_cos, self.x_sin = const(bh.T), const(dw @ bw @ cw), const(dw @ bw @ sw)
+        self.x_psd_cos, self.x_psd_sin = const(pcw), const(psw)
+        self.y_cos, self.y_sin, self.y_right = const(ch.T @ bh.T @ dh.T), const(sh.T @ bh.T @ dh.T), const(bw)
+        self.y_psd_cos, self.y_psd_sin = const(pch.T), const(psh.T)
+        self.shape = (h, w)
+        super().build(input_shape)
+
+    def _frequency(self, power, psd_cos, psd_sin, size, transpose):
+        if transpose:
+            psd = tf.square(tf.matmul(psd_cos, power)) + tf.square(tf.matmul(psd_sin, power))
+            psd = tf.transpose(psd, (0, 2, 1))
+        else:
+            psd = tf.square(tf.matmul(power, psd_cos)) + tf.square(tf.matmul(power, psd_sin))
+        depth = (size - 1)//2
+        mode = mode_index(tf.argmax(psd, axis=-1, output_type=tf.int32), depth)
+        return tf.cast(mode + 1, self.compute_dtype)*(1.0/size)
+
+    def call(self, x):
+        if x.shape.rank == 4: x = x[..., 0]
+        h, w = self.shape
+
+        left = tf.matmul(self.x_left, x)
+        power = tf.square(tf.matmul(left, self.x_cos)) + tf.square(tf.matmul(left, self.x_sin))
+        fx = self._frequency(power, self.x_psd_cos, self.x_psd_sin, w, transpose=False)
+
+        right = tf.matmul(x, self.y_right)
+        power = tf.square(tf.matmul(self.y_cos, right)) + tf.square(tf.matmul(self.y_sin, right))
+        fy = self._frequency(power, self.y_psd_cos, self.y_psd_sin, h, transpose=True)
+        return fx*fy
+
+    def get_config(self):
+        return {**super().get_config(), 'sigma': self.sigma}
+
+def build_pac_model(unet, threshold=0.5, sigma=2):
+    inputs = Input(unet.input_shape[1:])
+    mask = unet(inputs)
+    area = layers.Lambda(lambda m: tf.reduce_sum(tf.cast(m > threshold, m.dtype), axis=(1, 2, 3)), name='area')(mask)
+    scale = ScaleMeasurer(sigma, name='scale')(inputs)
+    return Model(inputs=inputs, outputs=[mask, area, scale], name='pac')
@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+# Instrumentação leve das etapas de cada requisição, exposta no formato de texto do Prometheus.
+# Cada worker do gunicorn mantém as suas próprias métricas, identificadas pelo rótulo `worker` (pid).
+
+ENABLED = os.environ.get('PAC_METRICS', '1') == '1'
+TIMING_HEADERS = os.environ.get('PAC_TIMING_HEADERS') == '1'
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_LOCK = threading.Lock()
+_HISTOGRAMS = {}
+_COUNTERS = Counter()
+_LOCAL = threading.local()
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0]*(len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def observe(name, value, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _LOCK:
+        if key not in _HISTOGRAMS:
+            _HISTOGRAMS[key] = Histogram()
+        _HISTOGRAMS[key].observe(value)
+
+def increment(name, amount=1, **labels):
+    with _LOCK:
+        _COUNTERS[(name, tuple(sorted(labels.items())))] += amount
+
+class Stage:
+    '''
+    Mede a duração do bloco `with` como uma observação de `pac_stage_seconds{stage=name}`
+    e a soma às durações da requisição atual (ver `start_request`).
+    '''
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+class NullStage:
+    __slots__ = ()
+    def __enter__(self): pass
+    def __exit__(self, *exc): pass
+
+NULL_STAGE = NullStage()
+
+def stage(name):
+    return Stage(name) if ENABLED else NULL_STAGE
+
+def record(name, elapsed):
+    observe('pac_stage_seconds', elapsed, stage=name)
+    timings = getattr(_LOCAL, 'timings', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + elapsed
+
+def start_request():
+    _LOCAL.timings = {}
+
+def finish_request():
+    '''
+    Durações, em segundos, das etapas executadas na thread atual desde `start_request`.
+    '''
+    timings = getattr(_LOCAL, 'timings', None) or {}
+    _LOCAL.timings = None
+    return timings
+
+def server_timing(timings):
+    # cabeçalho `Server-Timing`, exibido pelas ferramentas de desenvolvedor dos navegadores
+    return ', '.join(f'{name};dur={elapsed*1000:.2f}' for name, elapsed in timings.items())
+
+def _labels(labels, **extra):
+    labels = {**dict(labels), **extra}
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+def render(gauges=()):
+    '''
+    Métricas no formato de texto do Prometheus; `gauges` são tuplas `(nome, valor, rótulos)` adicionais.
+    '''
+    worker = os.getpid()
+    with _LOCK:
+        histograms = {key: (list(h.buckets), h.sum, h.count) for key, h in _HISTOGRAMS.items()}
+        counters = dict(_COUNTERS)
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+            if metric != name: continue
+            cumulative = 0
+            for bound, bucket in zip((*BUCKETS, '+Inf'), buckets):
+                cumulative += bucket
+                lines.append(f'{name}_bucket{_labels(labels, worker=worker, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels, worker=worker)} {total}')
+            lines.append(f'{name}_count{_labels(labels, worker=worker)} {count}')
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_labels(labels, worker=worker)} {value}')
+    previous = None
+    for name, value, labels in gauges:
+        if name != previous:
+            lines.append(f'# TYPE {name} gauge')
+            previous = name
+        lines.append(f'{name}{_labels(labels.items(), worker=worker)} {value}')
+    return '\n'.join(lines) + '\n'
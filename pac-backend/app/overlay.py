@@ -0,0 +1,142 @@
+import base64
+import os
+from io import BytesIO
+import numpy as np
+from PIL import Image
+from scipy import ndimage
+from skimage.measure import approximate_polygon, find_contours
+from .decoding import decode_reduced
+
+FORMATS = {'jpeg': 'image/jpeg', 'png': 'image/png', 'contours': 'application/json'}
+DEFAULTS = {
+    'format': os.environ.get('PAC_OVERLAY_FORMAT', 'jpeg'),
+    'max_size': int(os.environ.get('PAC_OVERLAY_MAX_SIZE', 0)) or None,
+    'quality': int(os.environ.get('PAC_OVERLAY_QUALITY', 95)),
+    'tolerance': 0.5,
+    'encoding': 'base64'
+}
+FILL_COLOR = (50, 200, 255)
+FILL_ALPHA = 120
+BOUNDARY_COLOR = (255, 255, 0)
+CROSS = ndimage.generate_binary_structure(2, 1)
+
+class OverlayError(ValueError):
+    pass
+
+def preview_size(size, max_size=None):
+    if not max_size or max(size) <= max_size:
+        return size
+    ratio = max_size/max(size)
+    return tuple(max(1, round(side*ratio)) for side in size)
+
+def upscale_mask(mask, size):
+    return np.asarray(Image.fromarray(mask.astype(np.uint8)).resize(size, Image.NEAREST), dtype=bool)
+
+def place_mask(mask, region, size):
+    '''
+    Máscara de tamanho `size` (largura, altura) da imagem inteira, a partir de `mask`, que ocupa a região
+    `region = (top, left, height, width)` de um mapa `[height, width]` da imagem inteira.
+    '''
+    top, left, height, width = region
+    ry, rx = size[1]/height, size[0]/width
+    y0, x0 = round(top*ry), round(left*rx)
+    y1, x1 = max(y0 + 1, round((top + mask.shape[0])*ry)), max(x0 + 1, round((left + mask.shape[1])*rx))
+    placed = np.zeros(size[::-1], bool)
+    placed[y0:y1, x0:x1] = upscale_mask(mask, (x1 - x0, y1 - y0))[:size[1] - y0, :size[0] - x0]
+    return placed
+
+def outer_boundaries(mask):
+    # equivalente a skimage.segmentation.find_boundaries(mask, mode='outer') para máscaras binárias
+    return ndimage.binary_dilation(mask, CROSS) & ~mask
+
+def composite(mask, image):
+    '''
+    Pinta a máscara sobre a imagem (mesma mistura de `Image.composite` com opacidade 120) e marca
+    o seu contorno, operando apenas com inteiros de 8/16 bits.
+    '''
+    pixels = np.array(image.convert('RGB'))
+    inside = pixels[mask].astype(np.uint16)
+    pixels[mask] = (inside*(255 - FILL_ALPHA) + np.array(FILL_COLOR, np.uint16)*FILL_ALPHA + 127)//255
+    pixels[outer_boundaries(mask)] = BOUNDARY_COLOR
+    return Image.fromarray(pixels)
+
+def palette_mask(mask):
+    '''
+    Máscara como imagem de paleta (fundo transparente, pellet e contorno), para ser sobreposta pelo cliente.
+    '''
+    indices = mask.astype(np.uint8)
+    indices[outer_boundaries(mask)] = 2
+    image = Image.fromarray(indices, 'P')
+    image.putpalette([0, 0, 0, *FILL_COLOR, *BOUNDARY_COLOR])
+    return image
+
+def contours(mask, size, tolerance=0.5, region=None):
+    '''
+    Polígonos `[[x, y], ...]` do contorno da máscara, em coordenadas da imagem original de tamanho `size`
+    (`region`: ver `place_mask`).
+    '''
+    top, left, height, width = region or (0, 0, *mask.shape)
+    ratio = np.array(size)/(width, height)
+    polygons = []
+    for contour in find_contours(np.pad(mask, 1).astype(np.uint8), 0.5): # a borda fecha os contornos que tocam a imagem
+        contour = approximate_polygon(contour - 1, tolerance)
+        polygons.append(np.round((contour[:, ::-1] + (left + 0.5, top + 0.5))*ratio, 1).tolist())
+    return polygons
+
+def encode(image, format, **kwargs):
+    buffered = BytesIO()
+    image.save(buffered, format=format, **kwargs)
+    return buffered.getvalue()
+
+def _is_integer(value, low, high):
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+def validate_options(options):
+    '''
+    Opções de `build_overlay` completadas com `DEFAULTS`; `OverlayError` se alguma for desconhecida ou inválida.
+    '''
+    if not isinstance(options, dict):
+        raise OverlayError('A sobreposição deve ser um objeto {"format": ..., "max_size": ..., ...}.')
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise OverlayError(f'Opções de sobreposição desconhecidas: {", ".join(sorted(unknown))}')
+    options = {**DEFAULTS, **options}
+    if options['format'] not in FORMATS:
+        raise OverlayError(f'Formato desconhecido: {options["format"]} (opções: {", ".join(FORMATS)})')
+    if options['encoding'] not in ('base64', 'binary'):
+        raise OverlayError(f'Codificação desconhecida: {options["encoding"]} (opções: base64, binary)')
+    if options['max_size'] is not None and not _is_integer(options['max_size'], 1, 1 << 16):
+        raise OverlayError('max_size deve ser nulo ou um inteiro positivo')
+    if not _is_integer(options['quality'], 1, 100):
+        raise OverlayError('quality deve ser um inteiro entre 1 e 100')
+    tolerance = options['tolerance']
+    if isinstance(tolerance, bool) or not isinstance(tolerance, (int, float)) or not 0 <= tolerance < float('inf'):
+        raise OverlayError('tolerance deve ser um número não negativo')
+    return options
+
+def build_overlay(mask, image, region=None, /, **options):
+    '''
+    Representação da segmentação `mask` (na resolução do modelo) sobre `image`; se `region` for informada,
+    `mask` cobre apenas essa região da imagem (ver `place_mask`), e é posicionada apenas na resolução da saída.
+
+    Args:
+        format (opcional): `'jpeg'` (imagem com a máscara sobreposta), `'png'` (apenas a máscara, em uma PNG de paleta
+            com fundo transparente) ou `'contours'` (lista de polígonos em coordenadas da imagem original).
+        max_size (opcional): Maior lado, em píxels, das imagens geradas; `None` mantém a resolução original.
+        quality (opcional): Qualidade da JPEG.
+        tolerance (opcional): Tolerância, em píxels da máscara, da simplificação dos polígonos.
+        encoding (opcional): `'base64'` (texto, para respostas JSON) ou `'binary'` (`bytes`).
+    '''
+    options = validate_options(options)
+    if options['format'] == 'contours':
+        return contours(mask, image.size, options['tolerance'], region)
+
+    size = preview_size(image.size, options['max_size'])
+    mask = upscale_mask(mask, size) if region is None else place_mask(mask, region, size)
+    if options['format'] == 'png':
+        content = encode(palette_mask(mask), 'PNG', transparency=bytes([0, FILL_ALPHA, 255]))
+    else:
+        if size != image.size:
+            image = decode_reduced(image, size).resize(size, Image.BILINEAR, reducing_gap=2)
+        content = encode(composite(mask, image), 'JPEG', quality=options['quality'])
+    return content if options['encoding'] == 'binary' else base64.b64encode(content).decode()
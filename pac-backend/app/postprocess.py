@@ -0,0 +1,150 @@
+import json
+import math
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from scipy import ndimage
+
+# Operações de pós-processamento sobre lotes de máscaras binárias [batch, height, width].
+# A conectividade é 1 (vizinhança em cruz) dentro de cada máscara, e nenhuma operação liga máscaras vizinhas do lote,
+# de modo que cada uma pode ser executada por uma única chamada ao `scipy.ndimage` para o lote inteiro.
+
+CROSS = ndimage.generate_binary_structure(2, 1)
+STACK = np.stack([np.zeros_like(CROSS), CROSS, np.zeros_like(CROSS)])
+MAX_AREA = 1 << 20
+MAX_ITERATIONS = 32
+
+class PostProcessError(ValueError):
+    pass
+
+def label(masks):
+    labels, _ = ndimage.label(masks, STACK)
+    return labels, np.bincount(labels.ravel())
+
+def remove_small_objects(masks, min_size=64):
+    '''
+    Remove os objetos com menos de `min_size` píxels (mesmo que `skimage.morphology.area_opening` em máscaras binárias).
+    '''
+    labels, sizes = label(masks)
+    keep = sizes >= min_size
+    keep[0] = False
+    return keep[labels]
+
+def remove_small_holes(masks, area_threshold=64):
+    '''
+    Preenche os buracos com menos de `area_threshold` píxels (mesmo que `skimage.morphology.area_closing` em máscaras binárias).
+    '''
+    return ~remove_small_objects(~masks, area_threshold)
+
+def binary_opening(masks, iterations=1):
+    return ndimage.binary_opening(masks, STACK, iterations)
+
+def binary_closing(masks, iterations=1):
+    return ndimage.binary_closing(masks, STACK, iterations)
+
+def fill_holes(masks):
+    return ndimage.binary_fill_holes(masks, STACK)
+
+def largest_component(masks):
+    '''
+    Mantém apenas o maior objeto de cada máscara (em caso de empate, o primeiro na ordem de varredura).
+    '''
+    labels, sizes = label(masks)
+    n = len(sizes)
+    # tamanho de cada rótulo em cada máscara [batch, n]: um rótulo só aparece na máscara a que pertence
+    offsets = np.arange(len(masks))[:, np.newaxis]*n
+    counts = np.bincount((labels.reshape(len(masks), -1) + offsets).ravel(), minlength=len(masks)*n).reshape(len(masks), n)
+    counts[:, 0] = 0
+    largest = np.argmax(counts, axis=1)
+    keep = np.zeros(n, bool)
+    keep[largest] = True
+    keep[0] = False # máscaras vazias
+    return keep[labels]
+
+Operation = namedtuple('Operation', 'function params sources fused unit')
+
+# parâmetros: nome -> (valor padrão, mínimo, máximo), na ordem dos argumentos da função;
+# `fused`: a operação repetida em sequência é executada uma única vez, com o maior valor do parâmetro;
+# `unit`: 'area' ou 'length' se o parâmetro for medido em píxels da máscara de IMG_SIZE (ver `compile_pipeline`)
+OPERATIONS = {
+    'area_opening': Operation(remove_small_objects, {'area_threshold': (64, 0, MAX_AREA)}, {'morphology'}, True, 'area'),
+    'remove_small_objects': Operation(remove_small_objects, {'min_size': (64, 0, MAX_AREA)}, {'morphology'}, True, 'area'),
+    'area_closing': Operation(remove_small_holes, {'area_threshold': (64, 0, MAX_AREA)}, {'morphology'}, True, 'area'),
+    'remove_small_holes': Operation(remove_small_holes, {'area_threshold': (64, 0, MAX_AREA)}, {'morphology'}, True, 'area'),
+    'binary_opening': Operation(binary_opening, {'iterations': (1, 1, MAX_ITERATIONS)}, {'ndimage'}, False, 'length'),
+    'binary_closing': Operation(binary_closing, {'iterations': (1, 1, MAX_ITERATIONS)}, {'ndimage'}, False, 'length'),
+    'fill_holes': Operation(fill_holes, {}, {'ndimage'}, False, None),
+    'binary_fill_holes': Operation(fill_holes, {}, {'ndimage'}, False, None),
+    'largest_component': Operation(largest_component, {}, set(), False, None),
+}
+
+def validate_step(name, config, resolution=1.0):
+    if name not in OPERATIONS:
+        raise PostProcessError(f'Pós-processamento desconhecido: {name} (opções: {", ".join(OPERATIONS)})')
+    operation = OPERATIONS[name]
+    source = config.get('source')
+    if source is not None and source not in operation.sources:
+        raise PostProcessError(f'Origem inválida para {name}: {source}')
+    params = config.get('params') or {}
+    unknown = set(params) - set(operation.params)
+    if unknown:
+        raise PostProcessError(f'Parâmetros desconhecidos para {name}: {", ".join(sorted(unknown))}')
+    values = []
+    for param, (default, low, high) in operation.params.items():
+        value = params.get(param, default)
+        if (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)
+                or value != int(value) or not low <= value <= high):
+            raise PostProcessError(f'{name}: {param} deve ser um inteiro entre {low} e {high}')
+        if operation.unit is not None:
+            value = max(low, round(value*resolution**(2 if operation.unit == 'area' else 1)))
+        values.append(int(value))
+    return operation, tuple(values)
+
+class Pipeline:
+    '''
+    Sequência validada de operações, aplicável a uma máscara [height, width] ou a um lote [batch, height, width].
+    '''
+    def __init__(self, steps):
+        self.steps = tuple(steps)
+
+    def __call__(self, masks):
+        masks = np.asarray(masks, bool)
+        if masks.ndim == 2:
+            return self(masks[np.newaxis])[0]
+        for function, args in self.steps:
+            masks = function(masks, *args)
+        return masks
+
+    def __len__(self):
+        return len(self.steps)
+
+def compile_pipeline(post_process, resolution=1.0):
+    '''
+    Valida a especificação `{nome: {'source': ..., 'params': {...}}}` (na ordem de execução) e cria o `Pipeline`
+    correspondente; repetições consecutivas de uma mesma remoção por área são combinadas em um único passo.
+
+    Os parâmetros são dados em píxels da máscara de tamanho `IMG_SIZE`; para máscaras com `resolution` vezes
+    mais píxels por lado (segmentação em blocos), áreas e distâncias são convertidas proporcionalmente.
+    '''
+    if not isinstance(post_process, dict):
+        raise PostProcessError('O pós-processamento deve ser um objeto {nome: {"source": ..., "params": {...}}}.')
+    steps = []
+    for name, config in post_process.items():
+        if not isinstance(config, dict):
+            raise PostProcessError(f'Configuração inválida para {name}')
+        operation, args = validate_step(name, config, resolution)
+        if operation.fused and steps and steps[-1][0] is operation.function:
+            steps[-1] = (operation.function, (max(steps[-1][1][0], args[0]),))
+        else:
+            steps.append((operation.function, args))
+    return Pipeline(steps)
+
+@lru_cache(maxsize=256)
+def _cached_pipeline(spec, resolution):
+    return compile_pipeline(json.loads(spec), resolution)
+
+def get_pipeline(post_process, resolution=1.0):
+    '''
+    `Pipeline` de `post_process`, compilado uma única vez por especificação.
+    '''
+    return _cached_pipeline(json.dumps(post_process), round(float(resolution), 3))
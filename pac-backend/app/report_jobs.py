@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from .batch import JOBS_DIR, remove_expired_jobs
+from .report_builder import render_report
+from .metrics import finish_request, record, start_request
+
+REPORT_WORKERS = int(os.environ.get('PAC_REPORT_WORKERS', 1))
+REPORT_QUEUE = int(os.environ.get('PAC_REPORT_QUEUE', 4))
+REPORT_NICE = int(os.environ.get('PAC_REPORT_NICE', 10))
+
+POOL = None
+SLOTS = None
+_PID = None
+_LOCK = threading.Lock()
+
+class ReportsBusy(RuntimeError):
+    pass
+
+def _lower_priority():
+    os.nice(REPORT_NICE)
+
+def _render(**kwargs):
+    # executado no processo de relatórios: as durações das etapas são devolvidas ao worker junto com o PDF
+    start_request()
+    report = render_report(**kwargs)
+    return report, finish_request()
+
+def get_pool():
+    '''
+    Processos dedicados à geração dos relatórios, criados sob demanda em cada worker.
+
+    Os processos são iniciados com `spawn`, para não herdarem o runtime do TensorFlow, e com prioridade reduzida
+    (`PAC_REPORT_NICE`), para que os relatórios não disputem a CPU com as medições.
+    '''
+    global POOL, SLOTS, _PID
+    with _LOCK:
+        if _PID != os.getpid():
+            _PID = os.getpid()
+            POOL = ProcessPoolExecutor(
+                REPORT_WORKERS,
+                mp_context= multiprocessing.get_context('spawn'),
+                initializer= _lower_priority
+            )
+            SLOTS = threading.BoundedSemaphore(REPORT_WORKERS + REPORT_QUEUE)
+        return POOL, SLOTS
+
+def submit_report(**kwargs):
+    '''
+    Enfileira a geração de um relatório (argumentos de `render_report`) e retorna um `Future` com o PDF.
+    Levanta `ReportsBusy` se já houver `PAC_REPORT_WORKERS + PAC_REPORT_QUEUE` relatórios pendentes.
+    '''
+    pool, slots = get_pool()
+    if not slots.acquire(blocking=False):
+        raise ReportsBusy('Muitos relatórios em andamento; tente novamente em instantes.')
+    try:
+        rendering = pool.submit(_render, **kwargs)
+    except BaseException:
+        slots.release()
+        raise
+    future = Future()
+
+    def finish(rendering):
+        slots.release()
+        try:
+            report, timings = rendering.result()
+        except BaseException as error:
+            future.set_exception(error)
+            return
+        for name, elapsed in timings.items():
+            record(name, elapsed)
+        future.set_result(report)
+
+    rendering.add_done_callback(finish)
+    return future
+
+def submit_report_job(**kwargs):
+    '''
+    Inicia a geração de um relatório em segundo plano; o PDF é gravado em `JOBS_DIR`,
+    de modo que pode ser consultado por qualquer worker.
+    '''
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
+    remove_expired_jobs()
+    job_id = uuid.uuid4().hex
+    marker = JOBS_DIR/f'{job_id}.report'
+    marker.touch()
+    try:
+        future = submit_report(**kwargs)
+    except ReportsBusy:
+        marker.unlink()
+        raise
+
+    def finish(future):
+        try:
+            temporary = JOBS_DIR/f'{job_id}.pdf.tmp'
+            temporary.write_bytes(future.result())
+            temporary.replace(JOBS_DIR/f'{job_id}.pdf')
+        except Exception as error:
+            (JOBS_DIR/f'{job_id}.error').write_text(str(error) or type(error).__name__)
+
+    future.add_done_callback(finish)
+    return job_id
+
+def report_path(job_id):
+    return JOBS_DIR/f'{job_id}.pdf'
+
+def report_status(job_id):
+    '''
+    Estado (`pending`, `done` ou `failed`) do relatório `job_id`, ou `None` se o trabalho não existir.
+    '''
+    if not re.fullmatch('[0-9a-f]{32}', job_id) or not (JOBS_DIR/f'{job_id}.report').exists():
+        return None
+    if report_path(job_id).exists():
+        return {'job': job_id, 'status': 'done'}
+    error = JOBS_DIR/f'{job_id}.error'
+    if error.exists():
+        return {'job': job_id, 'status': 'failed', 'error': error.read_text()}
+    return {'job': job_id, 'status': 'pending'}
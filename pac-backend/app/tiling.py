@@ -0,0 +1,63 @@
+import numpy as np
+
+# Divisão de imagens grandes em blocos sobrepostos para a U-Net, e reconstrução do mapa de probabilidades.
+
+class SegmentationModeError(ValueError):
+    pass
+
+def tile_starts(length, tile, overlap):
+    '''
+    Início de cada bloco ao longo de um eixo, com passo `tile - overlap`; o último bloco termina na borda.
+    '''
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride))
+    return starts + [length - tile]
+
+def blend_weights(tile, overlap):
+    '''
+    Pesos de cada bloco na reconstrução: decaem linearmente nas `overlap` bordas, de modo que as predições
+    perto das bordas (com menos contexto) contribuem menos e as emendas ficam suaves.
+    '''
+    ramp = np.minimum(np.arange(tile) + 1, overlap + 1)
+    ramp = np.minimum(ramp, ramp[::-1]).astype(np.float32)/(overlap + 1)
+    return np.outer(ramp, ramp)
+
+def split_tiles(image, tile=256, overlap=64):
+    '''
+    Blocos `tile`×`tile` sobrepostos de `image` [height, width] (completada por reflexão se for menor que um bloco),
+    e a posição (linha, coluna) de cada um.
+    '''
+    height, width = image.shape
+    padded = np.pad(image, ((0, max(0, tile - height)), (0, max(0, tile - width))), mode='reflect')
+    positions = [(y, x) for y in tile_starts(height, tile, overlap) for x in tile_starts(width, tile, overlap)]
+    return np.stack([padded[y:y + tile, x:x + tile] for y, x in positions]), positions
+
+def merge_tiles(tiles, positions, shape, overlap=64):
+    '''
+    Média ponderada (ver `blend_weights`) dos blocos `tiles` [n, tile, tile] nas posições `positions`.
+    '''
+    tile = tiles.shape[1]
+    height, width = shape
+    weights = blend_weights(tile, overlap)
+    total = np.zeros((max(height, tile), max(width, tile)), np.float32)
+    norm = np.zeros_like(total)
+    for (y, x), probabilities in zip(positions, tiles):
+        total[y:y + tile, x:x + tile] += weights*probabilities
+        norm[y:y + tile, x:x + tile] += weights
+    return (total/norm)[:height, :width]
+
+def roi_box(mask, margin=0.25, min_margin=8):
+    '''
+    Retângulo `(top, left, bottom, right)` que envolve os píxels de `mask`, ampliado em `margin` vezes
+    o seu tamanho (no mínimo `min_margin` píxels) de cada lado; `None` se a máscara estiver vazia.
+    '''
+    rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+    if len(rows) == 0:
+        return None
+    height, width = mask.shape
+    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    dy = max(min_margin, int(np.ceil(margin*(bottom - top))))
+    dx = max(min_margin, int(np.ceil(margin*(right - left))))
+    return max(0, top - dy), max(0, left - dx), min(height, bottom + dy), min(width, right + dx)
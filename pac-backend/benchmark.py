@@ -0,0 +1,195 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+HERE = Path(__file__).parent
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.calculator.warmup()
+warm = time.perf_counter()
+print(json.dumps({'import_s': imported - start, 'warmup_s': warm - imported, 'total_s': warm - start}))
+"""
+
+def timeit(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return np.array(times)*1000
+
+def summarize(times):
+    return {
+        'mean_ms': times.mean(),
+        'p50_ms': np.percentile(times, 50),
+        'p99_ms': np.percentile(times, 99),
+    }
+
+def benchmark_engines(names=None, repeat=50, batch_sizes=(1, 8), seed=0):
+    '''
+    Compara a latência de cada mecanismo de inferência (`app.engines.ENGINES`) na CPU.
+    '''
+    from app.calculator import IMG_SIZE, get_model
+    from app.engines import ENGINES, build_engine
+    rng = np.random.default_rng(seed)
+    calibration = rng.random((8, *IMG_SIZE, 1), dtype=np.float32)
+    results = []
+    for name in (names or ENGINES):
+        kwargs = {'calibration': calibration} if name == 'tflite-int8' else {}
+        engine = build_engine(name, get_model(), **kwargs)
+        for batch_size in batch_sizes:
+            batch = rng.random((batch_size, *IMG_SIZE, 1), dtype=np.float32)
+            engine(batch) # aquecimento (tracing, alocação de tensores)
+            times = timeit(lambda: engine(batch), repeat)
+            results.append({'engine': name, 'batch_size': batch_size, **summarize(times), 'per_image_ms': times.mean()/batch_size})
+    return pd.DataFrame(results)
+
+def benchmark_determinate(repeat=20, image_size=(1024, 768), seed=0):
+    '''
+    Compara a latência de `calculator.determinate` com as etapas separadas (NumPy `find_scale` + U-Net) 
+    e com o modelo combinado (`PAC_FUSED`).
+    '''
+    from PIL import Image
+    from app import calculator
+    image = Image.fromarray(np.random.default_rng(seed).integers(0, 256, (*image_size[::-1], 3), dtype=np.uint8))
+    results = []
+    for fused in (False, True):
+        calculator.FUSED, calculator.BATCHER = fused, None
+        calculator.determinate(image, {}) # aquecimento
+        times = timeit(lambda: calculator.determinate(image, {}), repeat)
+        results.append({'fused': fused, **summarize(times)})
+    return pd.DataFrame(results)
+
+def legacy_overlay(mask, image):
+    # implementação anterior de calculator.build_overlay (float64, resolução original), como referência
+    import base64
+    from io import BytesIO
+    from PIL import Image
+    from skimage.segmentation import mark_boundaries
+    from skimage.transform import resize
+    mask = resize(mask, image.size[::-1])
+    label = Image.fromarray((120*mask).astype(np.uint8)).convert('L')
+    overlay = Image.composite(Image.new('RGB', image.size, (50, 200, 255)), image, label)
+    buffered = BytesIO()
+    Image.fromarray((mark_boundaries(np.array(overlay), mask, (1, 1, 0))*255).astype(np.uint8)).save(buffered, format='JPEG', quality=95)
+    return base64.b64encode(buffered.getvalue()).decode()
+
+OVERLAY_OPTIONS = {
+    'jpeg': {},
+    'jpeg-1024': {'max_size': 1024, 'quality': 85},
+    'png': {},
+    'png-1024': {'format': 'png', 'max_size': 1024},
+    'png-binary': {'format': 'png', 'encoding': 'binary'},
+    'contours': {'format': 'contours'},
+}
+
+def benchmark_overlay(repeat=10, image_size=(4032, 3024), seed=0):
+    '''
+    Compara o tempo e o tamanho da resposta de `overlay.build_overlay` em cada configuração
+    para uma foto de 12 MP, incluindo a implementação anterior (`legacy`).
+    '''
+    from PIL import Image
+    from app.overlay import build_overlay
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 256, (*image_size[::-1], 3), dtype=np.uint8))
+    y, x = np.mgrid[:256, :256]
+    mask = (x - 128)**2/90**2 + (y - 120)**2/70**2 < 1
+    renderers = {'legacy': lambda: legacy_overlay(mask, image)}
+    for name, options in OVERLAY_OPTIONS.items():
+        options = {'format': name.split('-')[0], **options}
+        renderers[name] = lambda options=options: build_overlay(mask, image, **options)
+    results = []
+    for name, render in renderers.items():
+        output = render()
+        size = len(output) if isinstance(output, (bytes, str)) else len(json.dumps(output))
+        results.append({'overlay': name, 'bytes': size, **summarize(timeit(render, repeat))})
+    return pd.DataFrame(results)
+
+PHONE_SIZES = {'2MP': (1600, 1200), '8MP': (3264, 2448), '12MP': (4032, 3024), '48MP': (8000, 6000)}
+
+DECODE_SCRIPT = """
+import resource, sys, time
+import numpy as np
+from skimage.color import rgb2gray
+from skimage.transform import resize
+from app import calculator
+from app.decoding import open_image
+data = open(sys.argv[1], 'rb').read()
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if sys.argv[2] == 'full':
+    rgb2gray(resize(np.array(open_image(data)), calculator.IMG_SIZE))
+else:
+    calculator.preprocess(open_image(data))
+elapsed = time.perf_counter() - start
+print(elapsed*1000, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)/1024)
+"""
+
+def synthetic_jpeg(size, path, seed=0):
+    from PIL import Image
+    noise = np.random.default_rng(seed).integers(0, 256, (size[1]//16, size[0]//16, 3), dtype=np.uint8)
+    Image.fromarray(noise).resize(size, Image.BICUBIC).save(path, format='JPEG', quality=92)
+
+def benchmark_decode(sizes=PHONE_SIZES, repeat=5):
+    '''
+    Compara o pré-processamento com a decodificação completa (`np.array` + `resize` + `rgb2gray`) e com a
+    decodificação reduzida (`calculator.preprocess`), em fotos sintéticas dos tamanhos típicos de celulares:
+    latência e pico de memória adicional de cada execução, em processos novos.
+    '''
+    import tempfile
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, size in sizes.items():
+            path = Path(directory)/f'{name}.jpg'
+            synthetic_jpeg(size, path)
+            for decode in ('full', 'draft'):
+                runs = [
+                    subprocess.run(
+                        [sys.executable, '-c', DECODE_SCRIPT, str(path), decode],
+                        cwd= HERE, capture_output= True, check= True, text= True
+                    ).stdout.split()
+                    for _ in range(repeat)
+                ]
+                runs = np.array(runs, float)
+                results.append({'size': name, 'decode': decode, 'ms': np.median(runs[:, 0]), 'peak_mb': np.median(runs[:, 1])})
+    return pd.DataFrame(results)
+
+def benchmark_startup(repeat=3):
+    '''
+    Mede, em processos novos, o tempo de importação da aplicação e o tempo até o modelo estar aquecido,
+    com e sem o carregamento antecipado (`PAC_PRELOAD`).
+    '''
+    results = []
+    for preload in ('0', '1'):
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT],
+                cwd= HERE,
+                env= {**os.environ, 'PAC_PRELOAD': preload},
+                capture_output= True,
+                check= True,
+                text= True
+            ).stdout.strip().splitlines()[-1]
+            results.append({'preload': preload == '1', **json.loads(output)})
+    return pd.DataFrame(results).groupby('preload').mean()
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['startup']:
+        print(benchmark_startup().to_string())
+    elif sys.argv[1:] == ['decode']:
+        print(benchmark_decode().to_string(index=False))
+    elif sys.argv[1:] == ['overlay']:
+        print(benchmark_overlay().to_string(index=False))
+    elif sys.argv[1:] == ['determinate']:
+        print(benchmark_determinate().to_string(index=False))
+    else:
+        print(benchmark_engines(sys.argv[1:] or None).to_string(index=False))
@@ -0,0 +1,20 @@
+import gc
+import os
+import threading
+
+bind = '0.0.0.0:5000'
+threads = 8
+
+# Com PAC_PRELOAD=1 a aplicação (e os pesos da U-Net, ver app/__init__.py) é carregada uma única vez no processo mestre,
+# e os workers criados via fork compartilham essas páginas de memória (copy-on-write).
+preload_app = os.environ.get('PAC_PRELOAD') == '1'
+
+def when_ready(server):
+    # move os objetos já carregados para fora do coletor de lixo, evitando que ele os toque (e os copie) nos workers
+    gc.freeze()
+
+def post_worker_init(worker):
+    # o mecanismo de inferência e a primeira predição são feitos em cada worker, após o fork (o TensorFlow não é fork-safe)
+    if os.environ.get('PAC_WARMUP', '1') == '1':
+        from app.calculator import warmup
+        threading.Thread(target=warmup, daemon=True).start()
@@ -0,0 +1,86 @@
+import tensorflow as tf
+
+# Aumento de dados aplicado a cada lote durante o treinamento (ver `Augmentation`), sem cópias do conjunto de dados em memória.
+
+def _choose(condition, x, y):
+    # `tf.where` por amostra do lote [batch, height, width, chanels]
+    return tf.where(condition[:, tf.newaxis, tf.newaxis, tf.newaxis], x, y)
+
+class Augmentation:
+    '''
+    Transformações aleatórias aplicadas, de forma vetorizada, a lotes `(images, masks)` `shape = [batch, height, width, chanels]`.
+
+    Cada amostra recebe as suas próprias transformações, sorteadas com operações `stateless` a partir de uma semente por lote;
+    em `apply`, as sementes vêm de `tf.data.Dataset.random`, de modo que cada época é diferente, mas a sequência de épocas é
+    reprodutível para a mesma `seed`.
+
+    Parameters
+    ----------
+    flip : bool, default=True
+        Espelhamentos vertical e horizontal.
+    rotate : bool, default=True
+        Rotações de 90° (transposição, que combinada aos espelhamentos gera todas as rotações); apenas para imagens quadradas.
+    brightness : float, default=0.1
+        Variação máxima do brilho, em fração do intervalo de intensidades de cada imagem.
+    contrast : float, default=0.1
+        Variação relativa máxima do contraste.
+    scale : float, default=0.1
+        Ampliação máxima (recorte de uma região de lado `1/s`, `1 <= s <= 1 + scale`, em posição aleatória,
+        redimensionada para o tamanho original); as máscaras são interpoladas pelo vizinho mais próximo.
+    seed : int, default=0
+        Semente da sequência de transformações.
+    '''
+    def __init__(self, flip=True, rotate=True, brightness=0.1, contrast=0.1, scale=0.1, seed=0):
+        self.flip = flip
+        self.rotate = rotate
+        self.brightness = brightness
+        self.contrast = contrast
+        self.scale = scale
+        self.seed = seed
+
+    def __call__(self, images, masks, seed):
+        '''
+        Transforma um lote com a semente `seed` (tensor inteiro `shape = [2]`).
+        '''
+        images, masks = tf.convert_to_tensor(images), tf.convert_to_tensor(masks)
+        batch = tf.shape(images)[0]
+        seeds = tf.random.experimental.stateless_split(seed, 6)
+        coin = lambda i: tf.random.stateless_uniform([batch], seeds[i]) < 0.5
+
+        if self.rotate and images.shape[1] == images.shape[2]:
+            transpose = coin(0)
+            images = _choose(transpose, tf.transpose(images, [0, 2, 1, 3]), images)
+            masks = _choose(transpose, tf.transpose(masks, [0, 2, 1, 3]), masks)
+        if self.flip:
+            for i, axis in ((1, 1), (2, 2)):
+                flip = coin(i)
+                images = _choose(flip, tf.reverse(images, [axis]), images)
+                masks = _choose(flip, tf.reverse(masks, [axis]), masks)
+
+        if self.brightness or self.contrast:
+            low = tf.reduce_min(images, axis=(1, 2, 3), keepdims=True)
+            high = tf.reduce_max(images, axis=(1, 2, 3), keepdims=True)
+            mean = tf.reduce_mean(images, axis=(1, 2, 3), keepdims=True)
+            factor = tf.random.stateless_uniform([batch, 1, 1, 1], seeds[3], 1 - self.contrast, 1 + self.contrast)
+            shift = tf.random.stateless_uniform([batch, 1, 1, 1], seeds[4], -self.brightness, self.brightness)*(high - low)
+            images = tf.clip_by_value((images - mean)*factor + mean + shift, low, high)
+
+        if self.scale:
+            size = tf.shape(images)[1:3]
+            side = 1/tf.random.stateless_uniform([batch, 1], seeds[5], 1, 1 + self.scale)
+            corner = tf.random.stateless_uniform([batch, 2], tf.random.experimental.stateless_fold_in(seeds[5], 1))*(1 - side)
+            boxes = tf.concat([corner, corner + side], axis=1)
+            index = tf.range(batch)
+            images = tf.image.crop_and_resize(images, boxes, index, size)
+            masks = tf.image.crop_and_resize(masks, boxes, index, size, method='nearest')
+        return images, masks
+
+    def apply(self, dataset):
+        '''
+        Aplica as transformações a um `tf.data.Dataset` de lotes `(images, masks)`, em paralelo e sob demanda.
+        '''
+        seeds = tf.data.Dataset.random(self.seed, rerandomize_each_iteration=True).batch(2)
+        return tf.data.Dataset.zip((dataset, seeds)).map(
+            lambda batch, seed: self(*batch, seed),
+            num_parallel_calls= tf.data.AUTOTUNE
+        )
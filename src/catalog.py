@@ -0,0 +1,236 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from hashlib import sha1
+from pathlib import Path
+import numpy as np
+from .config import Paths
+
+COLUMNS = ('path', 'area', 'grp', 'jpg_mtime', 'png_mtime', 'jpg_size', 'png_size', 'hash')
+
+def file_hash(jpg_file):
+    '''
+    Hash (SHA-1) do conteúdo da imagem `jpg_file` e de sua máscara.
+    '''
+    digest = sha1()
+    for filepath in (jpg_file, jpg_file.with_suffix('.png')):
+        digest.update(filepath.read_bytes())
+    return digest.hexdigest()
+
+def parse_area(area):
+    '''
+    Área de uma amostra a partir do nome do arquivo (ex.: `'118.032_mm2'`) ou de um número.
+    '''
+    return float(str(area).split('_')[0])
+
+def scan(directory):
+    '''
+    Percorre `directory` uma única vez.
+
+    Returns
+    -------
+    tuple
+        (files, directories): caminhos relativos (`str`, separados por `/`) de todos os arquivos `.jpg` e `.png`,
+        e instante de modificação de cada diretório.
+    '''
+    files, directories = set(), {}
+    for root, _, filenames in os.walk(directory):
+        relative = Path(root).relative_to(directory).as_posix()
+        directories[relative] = os.stat(root).st_mtime_ns
+        prefix = '' if relative == '.' else relative + '/'
+        files.update(prefix + name for name in filenames if name.endswith(('.jpg', '.png')))
+    return files, directories
+
+def _match_parts(parts, patterns):
+    if not patterns:
+        return not parts
+    if patterns[0] == '**': # zero ou mais diretórios
+        return any(_match_parts(parts[i:], patterns[1:]) for i in range(len(parts) + 1))
+    return bool(parts) and fnmatchcase(parts[0], patterns[0]) and _match_parts(parts[1:], patterns[1:])
+
+def match(path, pattern):
+    '''
+    Mesmo critério de `Path.glob(f'{pattern}.jpg')`: o padrão é comparado parte a parte (`*` não atravessa `/`,
+    e `**` corresponde a qualquer número de diretórios).
+    '''
+    return _match_parts(path[:-len('.jpg')].split('/'), pattern.split('/'))
+
+class DatasetCatalog:
+    '''
+    Catálogo persistente (SQLite) das amostras de um diretório do conjunto de dados: caminho da imagem (a máscara tem o mesmo nome,
+    com extensão `.png`), área, grupo (diretório da amostra, ex.: `'train'` ou `'test'`), tamanhos, datas de modificação e hash.
+
+    O catálogo é atualizado automaticamente quando algum diretório foi modificado desde a última atualização (arquivos adicionados,
+    removidos ou renomeados), o que custa apenas uma consulta às datas dos diretórios; o hash só é recalculado para arquivos
+    novos ou modificados (amostras apenas movidas, como em `data.split_validation_data`, são reconhecidas pelo nome, tamanho e data).
+
+    Parameters
+    ----------
+    directory : pathlib.Path or None, default=None
+        Diretório das amostras; se `None`, `Paths.dataset`.
+    path : pathlib.Path or None, default=None
+        Arquivo do banco de dados; se `None`, `Paths.catalog`. Deve ficar fora de `directory`, para não alterar as suas datas de modificação.
+    '''
+    def __init__(self, directory=None, path=None):
+        self.directory = Path(directory or Paths.dataset)
+        self.path = Path(path or Paths.catalog)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as db:
+            db.execute('''
+                CREATE TABLE IF NOT EXISTS samples (
+                    path TEXT PRIMARY KEY, area REAL, grp TEXT, jpg_mtime INTEGER, png_mtime INTEGER,
+                    jpg_size INTEGER, png_size INTEGER, hash TEXT
+                )
+            ''')
+            db.execute('CREATE INDEX IF NOT EXISTS samples_area ON samples (area)')
+            db.execute('CREATE INDEX IF NOT EXISTS samples_grp ON samples (grp)')
+            db.execute('CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime INTEGER)')
+            db.execute('CREATE TABLE IF NOT EXISTS orphans (path TEXT PRIMARY KEY)')
+            db.execute('CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)')
+            stored = db.execute("SELECT value FROM info WHERE key = 'directory'").fetchone()
+            if stored != (str(self.directory.resolve()),): # catálogo de outro diretório: é refeito na próxima consulta
+                for table in ('samples', 'directories', 'orphans'):
+                    db.execute(f'DELETE FROM {table}')
+                db.execute("INSERT OR REPLACE INTO info VALUES ('directory', ?)", (str(self.directory.resolve()),))
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            with db: yield db # confirma a transação ao final do bloco
+        finally:
+            db.close()
+
+    def is_stale(self):
+        '''
+        `True` se algum diretório catalogado foi modificado (ou removido) desde a última atualização.
+        '''
+        with self._connect() as db:
+            directories = db.execute('SELECT path, mtime FROM directories').fetchall()
+        if not directories:
+            return True
+        for path, mtime in directories:
+            try:
+                if os.stat(self.directory/path).st_mtime_ns != mtime: return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def refresh(self, force=False):
+        '''
+        Atualiza o catálogo se estiver desatualizado (ou sempre, se `force = True`).
+
+        Returns
+        -------
+        dict
+            Número de amostras adicionadas, removidas e mantidas (vazio se o catálogo já estava atualizado).
+        '''
+        if not force and not self.is_stale():
+            return {}
+        files, directories = scan(self.directory)
+        with self._connect() as db:
+            previous = {row[0]: row for row in db.execute(f'SELECT {", ".join(COLUMNS)} FROM samples')}
+        moved = {(Path(path).name, *row[3:7]): row[7] for path, row in previous.items()}
+
+        rows, orphans = [], sorted(
+            path for path in files
+            if path[:-4] + ('.png' if path.endswith('.jpg') else '.jpg') not in files
+        )
+        for path in sorted(files):
+            if not path.endswith('.jpg') or path[:-4] + '.png' not in files:
+                continue
+            jpg_file = self.directory/path
+            jpg_stat, png_stat = jpg_file.stat(), jpg_file.with_suffix('.png').stat()
+            stats = (jpg_stat.st_mtime_ns, png_stat.st_mtime_ns, jpg_stat.st_size, png_stat.st_size)
+            old = previous.get(path)
+            if old is not None and tuple(old[3:7]) == stats:
+                digest = old[7]
+            else:
+                digest = moved.get((jpg_file.name, *stats)) or file_hash(jpg_file)
+            rows.append((path, parse_area(jpg_file.stem), jpg_file.parent.name, *stats, digest))
+
+        with self._connect() as db:
+            db.execute('DELETE FROM samples')
+            db.executemany(f'INSERT INTO samples VALUES ({", ".join("?"*len(COLUMNS))})', rows)
+            db.execute('DELETE FROM orphans')
+            db.executemany('INSERT INTO orphans VALUES (?)', [(path,) for path in orphans])
+            db.execute('DELETE FROM directories')
+            db.executemany('INSERT INTO directories VALUES (?, ?)', directories.items())
+        kept = len(set(previous) & {row[0] for row in rows})
+        return {'added': len(rows) - kept, 'removed': len(previous) - kept, 'kept': kept}
+
+    def query(self, area=None, min_area=None, max_area=None, group=None, pattern=None, columns=('path',)):
+        '''
+        Amostras (em ordem alfabética do caminho) que atendem a todos os filtros fornecidos.
+
+        Parameters
+        ----------
+        area : str, float or None
+            Área exata (ex.: `118.032` ou `'118.032_mm2'`).
+        min_area, max_area : float or None
+            Intervalo fechado de áreas.
+        group : str, iterable or None
+            Grupo(s) das amostras (ex.: `'train'`).
+        pattern : str or None
+            Padrão do caminho relativo sem extensão, como em `Path.glob` (ex.: `'**/*'`, `'test/*'`).
+        columns : tuple, default=('path',)
+            Colunas retornadas: `'path'`, `'area'`, `'group'`, `'jpg_mtime'`, `'png_mtime'`, `'jpg_size'`, `'png_size'` ou `'hash'`.
+
+        Returns
+        -------
+        list
+            Tuplas com as colunas pedidas.
+        '''
+        self.refresh()
+        conditions, params = [], []
+        if area is not None:
+            conditions.append('area = ?'); params.append(parse_area(area))
+        if min_area is not None:
+            conditions.append('area >= ?'); params.append(float(min_area))
+        if max_area is not None:
+            conditions.append('area <= ?'); params.append(float(max_area))
+        if group is not None:
+            groups = [group] if isinstance(group, str) else list(group)
+            conditions.append(f'grp IN ({", ".join("?"*len(groups))})'); params.extend(groups)
+        where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+        columns = tuple('grp' if column == 'group' else column for column in columns)
+        names = ('path', *(column for column in columns if column != 'path'))
+        with self._connect() as db:
+            rows = db.execute(f'SELECT {", ".join(names)} FROM samples {where} ORDER BY path', params).fetchall()
+        if pattern is not None:
+            rows = [row for row in rows if match(row[0], pattern)]
+        return [tuple(row[names.index(column)] for column in columns) for row in rows]
+
+    def files(self, **filters):
+        '''
+        Caminhos (`pathlib.Path`) das imagens que atendem aos filtros de `query`.
+        '''
+        return [self.directory/path for path, in self.query(**filters)]
+
+    def sample(self, n, seed=None, **filters):
+        '''
+        `n` imagens escolhidas aleatoriamente (sem reposição) entre as que atendem aos filtros de `query`.
+        '''
+        return list(np.random.default_rng(seed).choice(self.files(**filters), size=n, replace=False))
+
+    def orphans(self):
+        '''
+        Imagens sem máscara e máscaras sem imagem (caminhos relativos).
+        '''
+        self.refresh()
+        with self._connect() as db:
+            return [path for path, in db.execute('SELECT path FROM orphans ORDER BY path')]
+
+    def __len__(self):
+        self.refresh()
+        with self._connect() as db:
+            return db.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+
+def get_catalog(directory=None):
+    '''
+    Catálogo de `directory` (default: `Paths.dataset`), atualizado se necessário.
+    '''
+    catalog = DatasetCatalog(directory)
+    catalog.refresh()
+    return catalog
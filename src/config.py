@@ -22,4 +22,6 @@ class Paths:
     train = dataset/'train'
     test = dataset/'test'
     raw = data/'raw'
-    processed = data/'processed'
\ No newline at end of file
+    processed = data/'processed'
+    compiled = data/'compiled'
+    catalog = data/'catalog.sqlite'
\ No newline at end of file
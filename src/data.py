@@ -1,12 +1,17 @@
+import os
 import numpy as np
 import pandas as pd
 import tensorflow as tf
 from skimage.io import imread, imsave
 from skimage.transform import resize
+from skimage.util import img_as_ubyte
 from scipy.ndimage import center_of_mass
 from warnings import warn
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from .config import Paths, Default
-from .measure import find_scale, find_slope
+from .measure import find_scale_batch, find_slope_batch
+from .catalog import DatasetCatalog, get_catalog, parse_area, scan
 
 def _with_suffix(pattern, suffix):
     '''
@@ -54,7 +59,8 @@ def add_processed_data(replace=False):
 def check_data_integrity(directory):
     '''
     Verifica integridade dos dados no diretório `directory` 
-    conferindo se para cada arquivo `.jpg` (imagem) existe um `.png` (máscara) correspondente.
+    conferindo se para cada arquivo `.jpg` (imagem) existe um `.png` (máscara) correspondente, e vice-versa.
+    O diretório é percorrido uma única vez, e cada verificação é uma consulta a um conjunto (tempo linear no número de arquivos).
 
     Parameters
     ----------
@@ -65,22 +71,12 @@ def check_data_integrity(directory):
     -------
     None
     '''
-    jpg_files = list(directory.glob('**/*.jpg'))
-    png_files = list(directory.glob('**/*.png'))
+    files, _ = scan(directory)
     
     print(f'Verificando integridade dos dados em {directory}')
 
-    png_missing = []
-    for jpg_file in jpg_files:
-        png_file = jpg_file.with_suffix('.png')
-        if png_file not in png_files:
-            png_missing.append(str(png_file))
-
-    jpg_missing = []
-    for png_file in png_files:
-        jpg_file = png_file.with_suffix('.jpg')
-        if jpg_file not in jpg_files:
-            jpg_missing.append(str(jpg_file))
+    png_missing = sorted(str(directory/(path[:-4] + '.png')) for path in files if path.endswith('.jpg') and path[:-4] + '.png' not in files)
+    jpg_missing = sorted(str(directory/(path[:-4] + '.jpg')) for path in files if path.endswith('.png') and path[:-4] + '.jpg' not in files)
 
     issues = False
     if len(png_missing) > 0:
@@ -98,6 +94,9 @@ def flipping_augmentation(collection):
     '''
     Aumento os dados via espelhamento das imagens. As imagens serão espelhadas nos eixos `height` e `width`.
 
+    Obs.: A coleção aumentada ocupa 4 vezes mais memória; `augmentation.Augmentation` (via `segmentation.UNet.fit`)
+    aplica espelhamentos, rotações e variações de brilho, contraste e escala a cada lote, sem cópias.
+
     Parameters
     ----------
     collection: tensor-like
@@ -123,9 +122,9 @@ def load_by_area(area, **kwargs):
     Parameters
     ----------
     area : str
-        `string`, `float` ou `int` contendo o valor da área (no padrão internacional) a ser usado para procurar as amostras.
+        `string` (ex.: `'118.032_mm2'`), `float` ou `int` contendo o valor da área (no padrão internacional) a ser usado para procurar as amostras.
     **kwargs
-        Extra arguments to `load_collection`: refer to each metric documentation for a
+        Extra arguments to `load_pairs`: refer to each metric documentation for a
         list of all possible arguments.
 
     Returns
@@ -133,10 +132,7 @@ def load_by_area(area, **kwargs):
     tuple
         (jpg_files, png_files)
     '''
-    jpg_files = list(Paths.dataset.glob(f'**/{area}.jpg'))
-    png_files = map(lambda filename: filename.with_suffix('.png'), jpg_files)
-    return (load_collection(jpg_files, **kwargs), 
-            load_collection(png_files, **kwargs))
+    return load_pairs(get_catalog().files(area=area), **kwargs)
 
 def load_collection(pattern, grayscale=True, as_tensor=True, norm=True):
     '''
@@ -172,7 +168,137 @@ def load_collection(pattern, grayscale=True, as_tensor=True, norm=True):
 
     return collection
 
-def load_all(pattern='**/*', area=False, **kwargs):
+def _dataset_manifest(check_files=False):
+    '''
+    Lista as amostras de `Paths.dataset` (em ordem alfabética) com os instantes de modificação de seus arquivos.
+
+    O catálogo só é atualizado se algum diretório foi modificado, ou, com `check_files = True`, após consultar todos os arquivos
+    (ver `DatasetCatalog.refresh`).
+    '''
+    columns = ['path', 'area', 'group', 'jpg_mtime', 'png_mtime']
+    catalog = DatasetCatalog()
+    catalog.refresh(force=check_files)
+    return pd.DataFrame(catalog.query(columns=columns), columns=columns)
+
+def _files_changed(manifest):
+    '''
+    `True` se algum arquivo de `manifest` foi modificado ou removido; sobrescrever uma amostra não altera
+    a data do seu diretório, único critério de `DatasetCatalog.is_stale`, então apenas estes arquivos são consultados.
+    '''
+    for path, jpg_mtime, png_mtime in manifest[['path', 'jpg_mtime', 'png_mtime']].itertuples(index=False):
+        jpg_file = os.path.join(Paths.dataset, path)
+        try:
+            if os.stat(jpg_file).st_mtime_ns != jpg_mtime or os.stat(jpg_file[:-4] + '.png').st_mtime_ns != png_mtime:
+                return True
+        except FileNotFoundError:
+            return True
+    return False
+
+def _compiled_dir(grayscale=True, norm=True):
+    return Paths.compiled/('gray' if grayscale else 'rgb')/('norm' if norm else 'raw')
+
+def _is_up_to_date(directory, manifest):
+    try: saved = pd.read_csv(directory/'manifest.csv')
+    except FileNotFoundError: return False
+    columns = ['path', 'jpg_mtime', 'png_mtime']
+    return saved[columns].values.tolist() == manifest[columns].values.tolist()
+
+def compile_dataset(grayscale=True, norm=True, force=False, chunk_size=64):
+    '''
+    Pré-processa as amostras de `Paths.dataset` e as armazena em `Paths.compiled`, em arquivos `.npy` contíguos
+    (`images.npy` e `masks.npy`, `dtype = float32`) acompanhados de `manifest.csv` (caminho, área, grupo e data de modificação de cada amostra).
+
+    O pré-processamento só é refeito se alguma amostra foi adicionada, removida ou modificada desde a última compilação.
+
+    Parameters
+    ----------
+    grayscale : bool, default=True
+        Ver `load_collection`.
+    norm : bool, default=True
+        Ver `load_collection`.
+    force : bool, default=False
+        Se `True` o conjunto de dados será recompilado mesmo que esteja atualizado.
+    chunk_size : int, default=64
+        Número de imagens decodificadas de cada vez.
+
+    Returns
+    -------
+    pathlib.Path
+        Diretório com os arquivos compilados.
+    '''
+    directory = _compiled_dir(grayscale, norm)
+    manifest = _dataset_manifest()
+    if _files_changed(manifest):
+        manifest = _dataset_manifest(check_files=True)
+    if not force and _is_up_to_date(directory, manifest):
+        return directory
+
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory/'manifest.csv').unlink(missing_ok=True) # o manifesto só é escrito ao final, quando os arquivos estão completos
+    jpg_files = [Paths.dataset/path for path in manifest.path]
+    for name, files in (('images', jpg_files), ('masks', list(_with_suffix(jpg_files, '.png')))):
+        array = None
+        for i in range(0, len(files), chunk_size):
+            chunk = load_collection(files[i:i + chunk_size], grayscale=grayscale, norm=norm).numpy()
+            if array is None:
+                array = np.lib.format.open_memmap(directory/f'{name}.npy', mode='w+', dtype=np.float32, shape=(len(files), *chunk.shape[1:]))
+            array[i:i + len(chunk)] = chunk
+        if array is not None: array.flush()
+        del array
+    manifest.to_csv(directory/'manifest.csv', index=False)
+    return directory
+
+def load_compiled(grayscale=True, norm=True):
+    '''
+    Carrega (via `np.memmap`, sem cópia) o conjunto de dados compilado por `compile_dataset`, recompilando-o se estiver desatualizado.
+
+    Returns
+    -------
+    tuple
+        (images, masks, manifest): `np.memmap`, `np.memmap`, `pd.DataFrame`.
+    '''
+    directory = compile_dataset(grayscale, norm)
+    return (np.load(directory/'images.npy', mmap_mode='r'),
+            np.load(directory/'masks.npy', mmap_mode='r'),
+            pd.read_csv(directory/'manifest.csv'))
+
+def load_pairs(jpg_files, grayscale=True, as_tensor=True, norm=True, compiled=True):
+    '''
+    Carrega as imagens `jpg_files` de `Paths.dataset` e suas respectivas máscaras.
+
+    Parameters
+    ----------
+    jpg_files : iterable
+        Caminhos das imagens (`.jpg`).
+    grayscale, as_tensor, norm
+        Ver `load_collection`.
+    compiled : bool, default=True
+        Se `True` as amostras serão lidas do conjunto compilado (ver `compile_dataset`), em `float32`;
+        quando as amostras pedidas são consecutivas no conjunto compilado (ex.: um grupo inteiro), não há cópia se `as_tensor = False`.
+        Se `False` as imagens serão decodificadas via `load_collection`.
+
+    Returns
+    -------
+    tuple
+        (images, masks)
+    '''
+    jpg_files = list(jpg_files)
+    if not compiled:
+        return (load_collection(jpg_files, grayscale=grayscale, as_tensor=as_tensor, norm=norm),
+                load_collection(_with_suffix(jpg_files, '.png'), grayscale=grayscale, as_tensor=as_tensor, norm=norm))
+
+    images, masks, manifest = load_compiled(grayscale, norm)
+    index = dict(zip(manifest.path, range(len(manifest))))
+    idx = np.array([index[jpg_file.relative_to(Paths.dataset).as_posix()] for jpg_file in jpg_files], dtype=int)
+    if len(idx) > 0 and np.all(np.diff(idx) == 1):
+        idx = slice(idx[0], idx[-1] + 1)
+    output = (images[idx], masks[idx])
+    return tuple(
+        tf.convert_to_tensor(collection) if as_tensor else np.squeeze(collection) 
+        for collection in output
+    )
+
+def load_all(pattern='**/*', area=False, group=None, min_area=None, max_area=None, **kwargs):
     '''
     Carrega todas as amostras do conjunto de treinamento encontradas através do `pattern` fornecido.
 
@@ -182,8 +308,12 @@ def load_all(pattern='**/*', area=False, **kwargs):
         Caminho das amostras relativo a `Paths.dataset`.
     area : bool, default=False
         Se `True` as áreas são retornadas.
+    group : str, iterable or None, default=None
+        Se fornecido, apenas as amostras do(s) grupo(s) (ex.: `'train'`) são carregadas.
+    min_area, max_area : float or None, default=None
+        Se fornecidos, apenas as amostras com área no intervalo são carregadas.
     **kwargs
-        Extra arguments to `load_collection`: refer to each metric documentation for a
+        Extra arguments to `load_pairs`: refer to each metric documentation for a
         list of all possible arguments.
     
     Returns
@@ -191,14 +321,10 @@ def load_all(pattern='**/*', area=False, **kwargs):
     list
         (jpg_files, png_files), ou (jpg_files, png_files, areas) se `area = True`.
     '''
-    jpg_files = list(Paths.dataset.glob(f'{pattern}.jpg'))
-    png_files = map(lambda filename: filename.with_suffix('.png'), jpg_files)
-    output = [
-        load_collection(jpg_files, **kwargs),
-        load_collection(png_files, **kwargs)
-    ]
+    samples = get_catalog().query(pattern=pattern, group=group, min_area=min_area, max_area=max_area, columns=('path', 'area'))
+    output = list(load_pairs([Paths.dataset/path for path, _ in samples], **kwargs))
     if area: 
-        output.append(np.array(list(map(lambda filename: float(filename.stem.split('_')[0]), jpg_files))))
+        output.append(np.array([sample_area for _, sample_area in samples]))
     return output
 
 def load_dataset(augmentation, **kwargs):
@@ -210,7 +336,7 @@ def load_dataset(augmentation, **kwargs):
     augmentation : bool
         Se `True` o conjunto de dados será aumentado utilizando `flipping_augmentation`.
     **kwargs
-        Extra arguments to `load_collection`: refer to each metric documentation for a
+        Extra arguments to `load_pairs`: refer to each metric documentation for a
         list of all possible arguments.
     
     Returns
@@ -218,12 +344,9 @@ def load_dataset(augmentation, **kwargs):
     tuple
         (x_train, y_train), (x_test, y_test): Conjunto de treinamento.
     '''
-    train_jpg_files = list(Paths.train.glob('*.jpg'))
-    test_jpg_files = list(Paths.test.glob('*.jpg'))
-    x_train = load_collection(train_jpg_files, **kwargs)
-    y_train = load_collection(_with_suffix(train_jpg_files, '.png'), **kwargs)
-    x_test = load_collection(test_jpg_files, **kwargs)
-    y_test = load_collection(_with_suffix(test_jpg_files, '.png'), **kwargs)
+    catalog = get_catalog()
+    x_train, y_train = load_pairs(catalog.files(pattern=f'{Paths.train.name}/*'), **kwargs)
+    x_test, y_test = load_pairs(catalog.files(pattern=f'{Paths.test.name}/*'), **kwargs)
 
     if augmentation: # shape = [4*N, H, W, D]
         x_train = flipping_augmentation(x_train)
@@ -233,7 +356,110 @@ def load_dataset(augmentation, **kwargs):
 
     return (x_train, y_train), (x_test, y_test)
 
-def load_random(n=1, seed=None, get_area=False, **kwargs):
+def _decode(path, grayscale=True, norm=True):
+    '''
+    Decodifica (em grafo) uma imagem `.jpg` ou `.png`, no mesmo formato de `load_collection`: `shape = [height, width, chanels]`.
+    '''
+    content = tf.io.read_file(path)
+    image = tf.cond( # INTEGER_ACCURATE reproduz a decodificação de skimage.io.imread
+        tf.io.is_jpeg(content),
+        lambda: tf.io.decode_jpeg(content, channels=3, dct_method='INTEGER_ACCURATE'),
+        lambda: tf.io.decode_png(content, channels=3)
+    )
+    image = tf.cast(image, tf.float32)
+    if grayscale: # mesmos pesos de skimage.color.rgb2gray
+        image = tf.tensordot(image, tf.constant([0.2125, 0.7154, 0.0721]), axes=1)[..., tf.newaxis]
+    image.set_shape((*Default.image_size, 1 if grayscale else 3))
+    if norm:
+        cmin = tf.reduce_min(image, axis=(0, 1), keepdims=True)
+        cmax = tf.reduce_max(image, axis=(0, 1), keepdims=True)
+        image = (image - cmin)/(cmax - cmin)
+    return image
+
+def _flip_pair(image, label):
+    '''
+    Equivalente a `flipping_augmentation` para uma única amostra: retorna um `tf.data.Dataset` com as 4 versões espelhadas.
+    '''
+    flip = lambda x: tf.stack((x, x[::-1], x[:, ::-1], x[::-1, ::-1]))
+    return tf.data.Dataset.from_tensor_slices((flip(image), flip(label)))
+
+def stream_collection(jpg_files, augmentation, cache=True, shuffle=False, seed=None, **kwargs):
+    '''
+    Cria um `tf.data.Dataset` de pares (imagem, máscara) decodificados sob demanda.
+
+    Parameters
+    ----------
+    jpg_files : iterable
+        Caminhos das imagens (`.jpg`); as máscaras correspondentes (`.png`) devem estar no mesmo diretório.
+    augmentation : bool
+        Se `True` as amostras serão espelhadas durante a iteração (ver `flipping_augmentation`).
+    cache : bool or str, default=True
+        Se `True` as amostras decodificadas são mantidas em memória após a primeira época;
+        se `str` elas são armazenadas no arquivo indicado; se `False` são decodificadas a cada época.
+    shuffle : bool, default=False
+        Se `True` a ordem das amostras (incluindo as versões espelhadas) é embaralhada a cada época.
+    seed : int or None, default=None
+        Semente do embaralhamento.
+    **kwargs
+        Argumentos extras de `_decode` (`grayscale`, `norm`).
+
+    Returns
+    -------
+    tf.data.Dataset
+        Amostras `(image, mask)` não agrupadas em lotes, `shape = [height, width, chanels]`.
+    '''
+    jpg_files = list(map(str, jpg_files))
+    png_files = list(map(str, _with_suffix(map(Path, jpg_files), '.png')))
+    dataset = tf.data.Dataset.from_tensor_slices((jpg_files, png_files)).map(
+        lambda jpg, png: (_decode(jpg, **kwargs), _decode(png, **kwargs)),
+        num_parallel_calls= tf.data.AUTOTUNE
+    )
+    if cache: 
+        dataset = dataset.cache() if cache is True else dataset.cache(str(cache))
+    if augmentation: # as versões espelhadas são geradas a cada época, sem ocupar memória
+        dataset = dataset.flat_map(_flip_pair)
+    if shuffle: # depois do espelhamento, para que as 4 versões de uma amostra não caiam sempre no mesmo lote
+        size = (4 if augmentation else 1)*len(jpg_files)
+        dataset = dataset.shuffle(size, seed=seed, reshuffle_each_iteration=True)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def stream_dataset(augmentation, cache=True, shuffle=True, seed=None, **kwargs):
+    '''
+    Versão de `load_dataset` baseada em `tf.data`: as amostras de `Paths.train` e `Paths.test` são decodificadas
+    em paralelo durante o treinamento, em vez de carregadas de uma só vez na memória.
+
+    Parameters
+    ----------
+    augmentation : bool
+        Se `True` o conjunto de dados será aumentado via espelhamento.
+    cache : bool or str, default=True
+        Ver `stream_collection`; se `str`, os arquivos `<cache>-train` e `<cache>-test` serão utilizados.
+    shuffle : bool, default=True
+        Se `True` as amostras de treinamento serão embaralhadas a cada época.
+    seed : int or None, default=None
+        Semente do embaralhamento.
+    **kwargs
+        Argumentos extras de `_decode` (`grayscale`, `norm`).
+    
+    Returns
+    -------
+    tuple
+        (train, test): `tf.data.Dataset`, que podem ser passados para `segmentation.UNet` no lugar de `load_dataset()`.
+    '''
+    catalog = get_catalog()
+    return tuple(
+        stream_collection(
+            catalog.files(pattern=f'{directory.name}/*'), 
+            augmentation,
+            cache= cache if type(cache) is bool else f'{cache}-{directory.name}',
+            shuffle= shuffle and directory == Paths.train,
+            seed= seed,
+            **kwargs
+        )
+        for directory in (Paths.train, Paths.test)
+    )
+
+def load_random(n=1, seed=None, get_area=False, group=None, min_area=None, max_area=None, **kwargs):
     '''
     Carrega amostras aleatórias do conjunto de dados de treinamento.
 
@@ -245,8 +471,10 @@ def load_random(n=1, seed=None, get_area=False, **kwargs):
         Gerador de números pseodo-aleatórios.
     get_area : bool
         Se `True` a área das amostras serão retornada.
+    group, min_area, max_area
+        Filtros das amostras sorteadas (ver `load_all`).
     **kwargs
-        Extra arguments to `load_collection`: refer to each metric documentation for a
+        Extra arguments to `load_pairs`: refer to each metric documentation for a
         list of all possible arguments.
     
     Returns
@@ -254,12 +482,9 @@ def load_random(n=1, seed=None, get_area=False, **kwargs):
     list
         `[images, labels]`, ou `[images, labels, areas]` se `get_area = True`.
     '''
-    jpg_files = list(Paths.dataset.glob('**/*.jpg'))
-    chosens = np.random.default_rng(seed).choice(jpg_files, size=n, replace=False)
-    images = load_collection(chosens, **kwargs)
-    labels = load_collection([jpg_file.with_suffix('.png') for jpg_file in chosens], **kwargs)
-    out = [images, labels]
-    if get_area: out.append([float(jpg_file.stem) for jpg_file in chosens])
+    chosens = get_catalog().sample(n, seed, group=group, min_area=min_area, max_area=max_area)
+    out = list(load_pairs(chosens, **kwargs))
+    if get_area: out.append([parse_area(jpg_file.stem) for jpg_file in chosens])
     return out
 
 def split_validation_data(p, shuffle=True, seed=None, verbose=True):
@@ -281,7 +506,7 @@ def split_validation_data(p, shuffle=True, seed=None, verbose=True):
     -------
     None
     '''
-    all_jpg_files = list(Paths.dataset.glob('**/*.jpg'))
+    all_jpg_files = get_catalog().files()
     n_files = len(all_jpg_files)
     split_threshold = int(p*n_files)
 
@@ -303,26 +528,94 @@ def split_validation_data(p, shuffle=True, seed=None, verbose=True):
             f'Dados para validação: {split_threshold} amostras ({split_threshold/n_files*100:.2f}%).'
         ]))
 
-def regularize_raw_data(pattern=None, mode='crop'):
+REGULARIZATION_MODES = ('crop', 'resize')
+
+def _mask_centroid(msk, downsample=8):
+    '''
+    Centro de massa `(y, x)` da máscara `msk`, calculado sobre a máscara reduzida pela soma de blocos `downsample`×`downsample`.
+    '''
+    height, width = (side//downsample*downsample for side in msk.shape[:2])
+    blocks = msk[:height, :width].reshape(height//downsample, downsample, width//downsample, downsample, *msk.shape[2:])
+    small = blocks.sum(axis=(1, 3), dtype=np.float64)
+    if small.ndim == 3: small = small.mean(axis=-1)
+    y, x = center_of_mass(small)
+    return (y + 0.5)*downsample - 0.5, (x + 0.5)*downsample - 0.5
+
+def _crop_box(shape, center):
+    '''
+    Janela `(top, left, bottom, right)` de tamanho `Default.image_size` centrada em `center`, deslocada para dentro da imagem se necessário.
+    '''
+    (height, width), (y, x) = shape[:2], center
+    dh, dw = Default.image_height//2, Default.image_width//2
+    top = min(max(int(y) - dh, 0), max(height - 2*dh, 0))
+    left = min(max(int(x) - dw, 0), max(width - 2*dw, 0))
+    return top, left, top + 2*dh, left + 2*dw
+
+def _regularize_sample(sample, mode, downsample=8, dry_run=False):
+    '''
+    Regulariza uma amostra de `Paths.raw` (executada nos processos de `regularize_raw_data`), decodificando cada arquivo uma única vez.
+    '''
+    jpg_raw_file = Paths.raw/(sample + '.jpg')
+    jpg_final_file = Paths.processed/(sample + '.jpg')
+    msk = imread(jpg_raw_file.with_suffix('.png'))
+    height, width = msk.shape[:2]
+
+    if mode == 'crop':
+        top, left, bottom, right = _crop_box(msk.shape, _mask_centroid(msk, downsample))
+    else:
+        d = abs(height - width) # descarta o excesso do início do maior eixo, tornando a imagem quadrada
+        top, left = (d, 0) if height > width else (0, d)
+        bottom, right = height, width
+
+    plan = {
+        'sample': sample, 'mode': mode, 'height': height, 'width': width,
+        'top': top, 'left': left, 'bottom': bottom, 'right': right,
+        'jpg': str(jpg_final_file), 'png': str(jpg_final_file.with_suffix('.png')),
+        'exists': jpg_final_file.exists()
+    }
+    if dry_run:
+        return plan
+
+    img, msk = imread(jpg_raw_file)[top:bottom, left:right], msk[top:bottom, left:right]
+    if mode == 'resize':
+        img, msk = img_as_ubyte(resize(img, Default.image_size)), img_as_ubyte(resize(msk, Default.image_size))
+    imsave(jpg_final_file, img, check_contrast=False)
+    imsave(jpg_final_file.with_suffix('.png'), msk, check_contrast=False)
+    return plan
+
+def regularize_raw_data(pattern=None, mode='crop', workers=None, downsample=8, dry_run=False, verbose=True):
     '''
     Regulariza as amostras de `Paths.raw` no padrão de treinamento, e as move para `Paths.processed`.
 
+    Cada imagem e máscara é decodificada uma única vez, e as amostras são processadas em paralelo.
+
     Parameters
     ----------
     pattern : iterable or None, default=None
         Iterável contendo as amostras da pasta `Paths.raw` que serão regularizadas. Se `pattern = None` todas as amostras serão regularizadas.
     mode: str, list ou None, modo com o qual as imagens serão ajustadas.
         > `'crop'`: Recorta as imagens no formado padrão `Default.size` 
-                    de modo com que o centro do corte corresponda ao centro de massa da máscara.
+                    de modo com que o centro do corte corresponda ao centro de massa da máscara
+                    (deslocado, se necessário, para que o corte fique inteiramente dentro da imagem).
             Obs.: Este tipo de ajuste é indicado para imagens que possuem dimensões widescreen ou semelhantes (ex.: 9:20 ou 16:9), 
                 ou para imagens cuja a região do pellet seja pequena.
         > `'resize'`: Redimensiona a imagem para que atenda os padrões de treinamento `Default.size`.
             Obs.: Este tipo de ajuste é indicado para imagens que já possuem uma boa qualidade, 
                 porém com dimensões diferentes daquelas utilizadas nos dados de treinamento
+    workers : int or None, default=None
+        Número de processos utilizados; se `None`, `os.cpu_count()`.
+    downsample : int, default=8
+        Fator de redução da máscara no cálculo do centro de massa (modo `'crop'`).
+    dry_run : bool, default=False
+        Se `True` nenhum arquivo será escrito; apenas o plano (recorte de cada amostra) será retornado.
+    verbose : bool, default=True
+        Se `True`, o progresso será exibido.
     
     Returns
     -------
-    None
+    pd.DataFrame
+        Plano de cada amostra: dimensões originais, janela `top`, `left`, `bottom`, `right` aproveitada,
+        arquivos de destino e se eles já existiam.
     
     Exemples
     --------
@@ -333,40 +626,35 @@ def regularize_raw_data(pattern=None, mode='crop'):
     >>> regularize_raw_data(['118.032_mm2', '64.760_mm2'], mode=['crop', 'resize'])
 
     Já neste caso, apenas as amostras especificadas serão ajustadas, cada uma com seu respectivo método.
+
+    >>> regularize_raw_data(dry_run=True).query('exists')
+
+    Amostras que seriam sobrescritas, sem modificar nenhum arquivo.
     '''
     if pattern is None: 
         pattern = map(lambda filepath: filepath.stem, Paths.raw.glob('*.jpg'))
-    for i, sample in enumerate(pattern):
-        jpg_raw_file = Paths.raw/(sample + '.jpg')
-        png_raw_file = jpg_raw_file.with_suffix('.png')
-
-        jpg_final_file = Paths.processed/(sample + '.jpg')
-        png_final_file = jpg_final_file.with_suffix('.png')
-
-        img = imread(jpg_raw_file)
-        msk = imread(png_raw_file)
-
-        m = mode[i] if type(mode) is not str else mode
-
-        if m == 'crop':
-            y, x = center_of_mass(msk)
-            x, y = int(x), int(y)
-
-            dw = Default.image_width//2
-            dh = Default.image_height//2
-
-            imsave(jpg_final_file, imread(jpg_raw_file)[y-dh:y+dh, x-dw:x+dw])
-            imsave(png_final_file, imread(png_raw_file)[y-dh:y+dh, x-dw:x+dw])
-        
-        elif m == 'resize':
-            w, h = img.shape[:2]
-            if w != h:
-                d = abs(w - h)
-                if w > h: img, msk = img[d:], msk[d:]
-                elif h > w: img, msk = img[:, d:], msk[:, d:]
-
-            imsave(jpg_final_file, resize(img, Default.image_size))
-            imsave(png_final_file, resize(msk, Default.image_size))
+    samples = list(pattern)
+    modes = [mode]*len(samples) if type(mode) is str else list(mode)
+    unknown = set(modes) - set(REGULARIZATION_MODES)
+    if unknown:
+        raise ValueError(f'Modo desconhecido: {", ".join(map(str, unknown))} (opções: {", ".join(REGULARIZATION_MODES)})')
+    if not dry_run: Paths.processed.mkdir(parents=True, exist_ok=True)
+
+    plans = []
+    if workers == 1 or len(samples) <= 1:
+        for sample, m in zip(samples, modes):
+            plans.append(_regularize_sample(sample, m, downsample, dry_run))
+            if verbose: print(f'\rRegularizando amostras: {len(plans)}/{len(samples)}', end='')
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_regularize_sample, sample, m, downsample, dry_run) for sample, m in zip(samples, modes)]
+            for future in as_completed(futures):
+                plans.append(future.result())
+                if verbose: print(f'\rRegularizando amostras: {len(plans)}/{len(samples)}', end='')
+    if verbose and samples: print()
+
+    order = {sample: i for i, sample in enumerate(samples)}
+    return pd.DataFrame(sorted(plans, key=lambda plan: order[plan['sample']]))
 
 def get_info():
     '''
@@ -378,23 +666,77 @@ def get_info():
     '''
     return pd.read_csv(Paths.dataset/'info.csv')
 
-def update_info():
+INFO_COLUMNS = ['area', 'group', 'scale', 'delta_scale', 'slope', 'delta_slope', 'area_pixel']
+MEASURE_COLUMNS = ['scale', 'delta_scale', 'slope', 'delta_slope', 'area_pixel']
+
+def _measure_samples(jpg_files):
     '''
-    Atualizar tabela de informações sobre o dataset.
+    Calcula as colunas `MEASURE_COLUMNS` de um grupo de amostras (executada nos processos de `update_info`).
     '''
-    dataframe = []
-    for jpg_file in Paths.dataset.glob('**/*.jpg'):
-        img = imread(jpg_file, as_gray= True)
+    imgs = np.stack([imread(jpg_file, as_gray=True) for jpg_file in jpg_files])
+    scales, d_scales = find_scale_batch(imgs)
+    slopes, d_slopes = find_slope_batch(imgs)
+    rows = []
+    for jpg_file, scale, d_scale, slope, d_slope in zip(jpg_files, scales, d_scales, slopes, d_slopes):
         mask = imread(jpg_file.with_suffix('.png'), as_gray=True)
-        scale, d_scale = find_scale(img)
-        slope, d_slope = find_slope(img)
-        dataframe.append({
-            'area': float(jpg_file.stem.split('_')[0]),
-            'group': jpg_file.parent.stem, 
+        rows.append({
             'scale': scale,
             'delta_scale': d_scale,
             'slope': slope,
             'delta_slope': d_slope,
             'area_pixel': np.sum((mask - mask.min())/(mask.max() - mask.min()))
         })
-    pd.DataFrame(dataframe).sort_values('area').to_csv(Paths.dataset/'info.csv', index=False)
+    return rows
+
+def update_info(workers=None, chunk_size=16, force=False, verbose=True):
+    '''
+    Atualizar tabela de informações sobre o dataset.
+
+    O índice completo (incluindo caminho, datas de modificação e hash de cada amostra, obtidos do catálogo) é mantido em `info.feather`,
+    e apenas as amostras novas ou modificadas são medidas; amostras apenas movidas (ex.: por `split_validation_data`)
+    são reconhecidas pelo hash e reaproveitadas. A tabela `info.csv` é exportada a partir deste índice.
+
+    Parameters
+    ----------
+    workers : int or None, default=None
+        Número de processos utilizados nas medições; se `None`, `os.cpu_count()`.
+    chunk_size : int, default=16
+        Número de amostras medidas por tarefa.
+    force : bool, default=False
+        Se `True` todas as amostras serão medidas novamente.
+    verbose : bool, default=True
+        Se `True`, o número de amostras medidas e reaproveitadas será exibido.
+    '''
+    index_path = Paths.dataset/'info.feather'
+    if force or not index_path.exists(): previous = pd.DataFrame(columns=['path', 'jpg_mtime', 'png_mtime', 'hash', *INFO_COLUMNS])
+    else: previous = pd.read_feather(index_path)
+    by_hash = previous.drop_duplicates('hash').set_index('hash')
+
+    catalog = DatasetCatalog()
+    catalog.refresh(force=True) # confere tamanho e data de cada arquivo, detectando também amostras modificadas
+    rows, pending = [], []
+    for path, jpg_mtime, png_mtime, area, group, digest in catalog.query(columns=('path', 'jpg_mtime', 'png_mtime', 'area', 'group', 'hash')):
+        row = {'path': path, 'jpg_mtime': jpg_mtime, 'png_mtime': png_mtime, 'area': area, 'group': group, 'hash': digest}
+        if digest in by_hash.index:
+            row.update(by_hash.loc[digest, MEASURE_COLUMNS].to_dict())
+        else:
+            pending.append((len(rows), Paths.dataset/path))
+        rows.append(row)
+
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    tasks = [[jpg_file for _, jpg_file in chunk] for chunk in chunks]
+    if workers == 1 or len(tasks) <= 1:
+        results = list(map(_measure_samples, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_measure_samples, tasks))
+    for chunk, measures in zip(chunks, results):
+        for (i, _), measure in zip(chunk, measures):
+            rows[i].update(measure)
+
+    if verbose:
+        print(f'{len(rows)} amostras: {len(pending)} medidas, {len(rows) - len(pending)} reaproveitadas.')
+
+    index = pd.DataFrame(rows, columns=previous.columns)
+    index.to_feather(index_path)
+    index[INFO_COLUMNS].sort_values('area').to_csv(Paths.dataset/'info.csv', index=False)
@@ -0,0 +1,151 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from .config import Paths
+from .catalog import get_catalog, parse_area
+from .data import get_info, load_pairs
+from .metrics import DSC, IoU
+
+CHECKPOINT = re.compile(r'weights\.(\d+)\.h5$')
+RANKING = ('area_error', 'area_mape', 'IoU')
+
+def list_checkpoints(directory, epochs=None):
+    '''
+    Checkpoints `weights.{epoch:04d}.h5` de `directory`, em ordem de época: lista de `(epoch, path)`.
+    '''
+    checkpoints = []
+    for path in directory.glob('weights.*.h5'):
+        found = CHECKPOINT.search(path.name)
+        if found and (epochs is None or int(found[1]) in epochs):
+            checkpoints.append((int(found[1]), path))
+    return sorted(checkpoints)
+
+def sample_scales(jpg_files):
+    '''
+    Escala (área de um píxel) de cada amostra segundo `info.csv` (ver `data.update_info`), ou `NaN` se a amostra não estiver na tabela.
+    '''
+    try: info = get_info().drop_duplicates(['area', 'group']).set_index(['area', 'group']).scale
+    except FileNotFoundError: return np.full(len(jpg_files), np.nan)
+    return np.array([info.get((parse_area(jpg_file.stem), jpg_file.parent.name), np.nan) for jpg_file in jpg_files])
+
+def predict_metrics(forward, x, y, batch_size=64):
+    '''
+    Uma passagem de `x` pela rede (`forward`, em lotes de `batch_size`), com as métricas de cada amostra:
+    `IoU`, `DSC`, área verdadeira e área predita (soma das probabilidades, como em `metrics.area_mape`) e número de píxels acima de 0.5.
+    '''
+    columns = {name: [] for name in ('IoU', 'DSC', 'area_true', 'area_pred', 'pixels')}
+    for i in range(0, len(x), batch_size):
+        for name, values in forward(x[i:i + batch_size], y[i:i + batch_size]).items():
+            columns[name].append(values.numpy())
+    return {name: np.concatenate(values) for name, values in columns.items()}
+
+def build_forward(model):
+    @tf.function(reduce_retracing=True)
+    def forward(x, y):
+        y_pred = tf.cast(model(x, training=False), tf.float32)
+        y = tf.cast(y, tf.float32)
+        return {
+            'IoU': IoU(y, y_pred),
+            'DSC': DSC(y, y_pred),
+            'area_true': tf.reduce_sum(y, axis=(1, 2, 3)),
+            'area_pred': tf.reduce_sum(y_pred, axis=(1, 2, 3)),
+            'pixels': tf.reduce_sum(tf.cast(y_pred > 0.5, tf.float32), axis=(1, 2, 3))
+        }
+    return forward
+
+def summarize(metrics, areas, scales):
+    '''
+    Métricas médias de um checkpoint: `IoU`, `DSC`, `area_mape` (em píxels) e, para as amostras com escala conhecida,
+    erro percentual médio (`area_error`) e erro absoluto médio (`area_mae`, em unidades da área) da área real estimada
+    como no aplicativo (píxels acima de 0.5 vezes a escala).
+    '''
+    real = metrics['pixels']*scales
+    known = ~np.isnan(real)
+    return {
+        'IoU': metrics['IoU'].mean(),
+        'DSC': metrics['DSC'].mean(),
+        'area_mape': np.mean(np.abs(metrics['area_pred'] - metrics['area_true'])/metrics['area_true'])*100,
+        'area_error': np.mean(np.abs(real[known] - areas[known])/areas[known])*100 if known.any() else np.nan,
+        'area_mae': np.mean(np.abs(real[known] - areas[known])) if known.any() else np.nan
+    }
+
+def evaluate_checkpoint(model, forward, checkpoint, x, y, areas, scales, batch_size=64):
+    model.load_weights(checkpoint)
+    return summarize(predict_metrics(forward, x, y, batch_size), areas, scales)
+
+_WORKER = {}
+
+def _init_worker(model_path, x, y, areas, scales, batch_size):
+    # cada processo carrega o modelo uma única vez e recebe o conjunto de teste já decodificado
+    model = tf.keras.models.load_model(model_path, compile=False)
+    _WORKER.update(model=model, forward=build_forward(model), x=x, y=y, areas=areas, scales=scales, batch_size=batch_size)
+
+def _evaluate_in_worker(checkpoint):
+    w = _WORKER
+    return evaluate_checkpoint(w['model'], w['forward'], checkpoint, w['x'], w['y'], w['areas'], w['scales'], w['batch_size'])
+
+def sweep_checkpoints(model, directory, jpg_files=None, batch_size=64, epochs=None, workers=1, model_path=None, sort_by=None):
+    '''
+    Avalia todos os checkpoints `weights.*.h5` de `directory` no conjunto de teste.
+
+    Os pesos de cada checkpoint são carregados no mesmo modelo `model` (já construído), e as amostras são decodificadas
+    uma única vez e percorridas em lotes grandes por uma função compilada (`tf.function`), calculando todas as métricas
+    em uma única passagem por checkpoint. Os pesos originais de `model` são restaurados ao final.
+
+    Parameters
+    ----------
+    model : tf.keras.Model
+        Modelo com a mesma arquitetura dos checkpoints.
+    directory : pathlib.Path
+        Diretório dos checkpoints.
+    jpg_files : iterable or None, default=None
+        Imagens avaliadas; se `None`, as amostras de `Paths.test`.
+    batch_size : int, default=64
+        Número de imagens por lote.
+    epochs : iterable or None, default=None
+        Épocas avaliadas; se `None`, todas.
+    workers : int, default=1
+        Número de processos; com `workers > 1` cada processo carrega o modelo salvo em `model_path` e avalia parte dos checkpoints.
+    model_path : pathlib.Path or None, default=None
+        Modelo salvo (`.h5`), necessário se `workers > 1`.
+    sort_by : str or None, default=None
+        Coluna da classificação; se `None`, a primeira disponível entre `RANKING`.
+
+    Returns
+    -------
+    pd.DataFrame
+        Uma linha por checkpoint (`epoch`, `IoU`, `DSC`, `area_mape`, `area_error`, `area_mae`), da melhor para a pior.
+    '''
+    if jpg_files is None:
+        jpg_files = get_catalog().files(pattern=f'{Paths.test.name}/*')
+    jpg_files = list(jpg_files)
+    checkpoints = list_checkpoints(directory, None if epochs is None else set(epochs))
+    paths = [path for _, path in checkpoints]
+    x, y = (collection.numpy() for collection in load_pairs(jpg_files))
+    areas = np.array([parse_area(jpg_file.stem) for jpg_file in jpg_files])
+    scales = sample_scales(jpg_files)
+
+    if workers > 1 and len(paths) > 1:
+        if model_path is None:
+            raise ValueError('model_path é necessário para avaliar os checkpoints em paralelo.')
+        with ProcessPoolExecutor( # 'spawn': o TensorFlow não é seguro após fork
+            max_workers= workers, mp_context= get_context('spawn'),
+            initializer= _init_worker, initargs= (model_path, x, y, areas, scales, batch_size)
+        ) as executor:
+            rows = list(executor.map(_evaluate_in_worker, paths))
+    else:
+        forward = build_forward(model)
+        weights = model.get_weights()
+        try:
+            rows = [evaluate_checkpoint(model, forward, path, x, y, areas, scales, batch_size) for path in paths]
+        finally:
+            model.set_weights(weights)
+
+    table = pd.DataFrame(rows, columns=['IoU', 'DSC', 'area_mape', 'area_error', 'area_mae'])
+    table.insert(0, 'epoch', [epoch for epoch, _ in checkpoints])
+    if sort_by is None:
+        sort_by = next(column for column in RANKING if table[column].notna().any()) if len(table) else 'epoch'
+    return table.sort_values(sort_by, ascending=sort_by not in ('IoU', 'DSC')).reset_index(drop=True)
@@ -1,9 +1,10 @@
 import numpy as np
 import tensorflow as tf
-from scipy.stats import mode, circmean, circstd
+from functools import lru_cache
 from scipy.ndimage import gaussian_filter
 from tensorflow.keras import Model, Input
-from tensorflow.keras.layers import Lambda
+from tensorflow.keras.layers import Lambda, Layer
+from .config import Default
 
 def FFT(x):
     return np.abs(np.fft.fft(x))
@@ -17,28 +18,132 @@ def Cxx(x):
 def PSD(x):
     return FFT(Cxx(x))
 
-def find_scale(img, sigma=2):
-    Iy, Ix = np.gradient(img)
+def PSD_batch(x):
+    '''
+    Densidade espectral (módulo da FFT da autocorrelação) de cada linha de `x`, ao longo do último eixo.
+
+    Equivalente a `np.apply_along_axis(PSD, -1, x)`, porém a autocorrelação é calculada de uma só vez
+    para todas as linhas através do teorema de Wiener–Khinchin (`irfft(|rfft(x)|²)`), com preenchimento
+    de zeros para evitar a correlação circular. Apenas as frequências não negativas são retornadas.
+
+    Parameters
+    ----------
+    x : array-like
+        Sinais reais, `shape = [..., W]`.
+
+    Returns
+    -------
+    np.ndarray
+        Módulo da `rfft` da autocorrelação (modo `'same'`), `shape = [..., W//2 + 1]`.
+    '''
+    W = x.shape[-1]
+    L = 1 << int(np.ceil(np.log2(2*W - 1))) # tamanho da FFT sem sobreposição circular
+    F = np.fft.rfft(x, n=L, axis=-1)
+    acf = np.fft.irfft(F.real**2 + F.imag**2, n=L, axis=-1)
+    lags = np.arange(W) + (W - 1)//2 - (W - 1) # atrasos correspondentes a np.correlate(..., mode='same')
+    return np.abs(np.fft.rfft(acf[..., lags%L], axis=-1))
+
+def _bulk_mode(D, n_bins):
+    '''
+    Moda de cada linha de `D` (índices inteiros em `[0, n_bins)`); em caso de empate o menor índice é escolhido,
+    assim como em `scipy.stats.mode`.
+    '''
+    offsets = np.arange(D.shape[0])[:, np.newaxis]*n_bins
+    counts = np.bincount((D + offsets).ravel(), minlength=D.shape[0]*n_bins)
+    return np.argmax(counts.reshape(D.shape[0], n_bins), axis=-1)
+
+def find_scale_batch(imgs, sigma=2):
+    '''
+    Determina a escala (área de um píxel, em unidades do papel milimetrado) de um lote de imagens.
+
+    Parameters
+    ----------
+    imgs : array-like
+        Imagens em tons de cinza, `shape = [n_batch, height, width]`.
+    sigma : float, default=2
+        Desvio padrão do filtro gaussiano aplicado aos gradientes.
+
+    Returns
+    -------
+    tuple
+        (scale, delta_scale): `np.ndarray`, `shape = [n_batch]`.
+    '''
+    imgs = np.asarray(imgs)
+    Iy, Ix = np.gradient(imgs, axis=(1, 2))
     fs, delta = [], []
-    for dI in (Ix, Iy.T):
-        freqs = np.fft.fftfreq(dI.shape[1], 1)
+    for dI in (Ix, Iy.transpose(0, 2, 1)):
+        n = dI.shape[-1]
+        freqs = np.fft.fftfreq(n, 1)
         pos = freqs > 0
-        dI_gauss = gaussian_filter(dI, sigma)
-        D = np.apply_along_axis(lambda y: freqs[pos][np.argmax(PSD(y)[pos])], 1, dI_gauss)
-        fs.append(mode(D, keepdims=True).mode[0])
-        delta.append(0.5/dI.shape[1])
-    
+        dI_gauss = gaussian_filter(dI, (0, sigma, sigma))
+        D = np.argmax(PSD_batch(dI_gauss)[..., 1:pos.sum() + 1], axis=-1)
+        fs.append(freqs[pos][_bulk_mode(D, pos.sum())])
+        delta.append(0.5/n)
+
     (fx, fy), (dx, dy) = fs, delta
     return fx*fy, np.sqrt((dx*fy)**2 + (dy*fx)**2)
 
+def find_scale(img, sigma=2):
+    scale, delta = find_scale_batch(np.asarray(img)[np.newaxis], sigma)
+    return scale[0], delta[0]
+
 def find_slope(img, beta=3e-3):
-    fft2d = FFT2(img)
-    loc = fft2d > fft2d.max()*beta
-    X = np.arange(-img.shape[1]//2, img.shape[1]//2)
-    Y = np.arange(-img.shape[0]//2, img.shape[0]//2)
-    X, Y = np.meshgrid(X, Y)
-    H = 90 - np.degrees(np.arctan2(Y[loc], X[loc]))%90
-    return circmean(H, low=0, high=90), circstd(H, low=0, high=90)
+    slope, delta = find_slope_batch(np.asarray(img)[np.newaxis], beta)
+    return slope[0], delta[0]
+
+@lru_cache(maxsize=8)
+def _slope_lut(shape):
+    '''
+    Tabelas (seno, cosseno e multiplicidade) dos ângulos de cada frequência de `np.fft.rfft2`, para imagens de formato `shape`.
+
+    Os ângulos são os mesmos da grade centralizada (`fftshift`) usada originalmente por `find_slope`. Como a `rfft2` contém apenas
+    metade do espectro, cada posição cuja frequência simétrica (hermitiana) não está na metade calculada também acumula o ângulo
+    desta, de modo que as somas sobre a metade equivalem às somas sobre o espectro completo.
+    '''
+    h, w = shape
+    X, Y = np.meshgrid(np.arange(-w//2, w//2), np.arange(-h//2, h//2))
+    H = np.fft.ifftshift(90 - np.degrees(np.arctan2(Y, X))%90) # ângulos na ordem natural da FFT
+    theta = np.radians(H*4) # período de 90°
+
+    rows, cols = np.meshgrid(np.arange(h), np.arange(w//2 + 1), indexing='ij')
+    mirror = (-rows%h, -cols%w)
+    outside = mirror[1] > w//2 # a frequência simétrica não pertence à metade calculada pela rfft2
+
+    luts = (
+        np.sin(theta[rows, cols]) + outside*np.sin(theta[mirror]),
+        np.cos(theta[rows, cols]) + outside*np.cos(theta[mirror]),
+        1.0 + outside
+    )
+    for lut in luts: lut.setflags(write=False)
+    return luts
+
+def find_slope_batch(imgs, beta=3e-3):
+    '''
+    Determina a inclinação (em graus, entre 0 e 90) das linhas do papel milimetrado em um lote de imagens,
+    através da média circular dos ângulos das frequências mais intensas do espectro 2D.
+
+    Parameters
+    ----------
+    imgs : array-like
+        Imagens em tons de cinza, `shape = [n_batch, height, width]`.
+    beta : float, default=3e-3
+        Limiar, relativo ao máximo do espectro de cada imagem, a partir do qual as frequências são consideradas.
+
+    Returns
+    -------
+    tuple
+        (slope, delta_slope): média e desvio padrão circulares, `np.ndarray`, `shape = [n_batch]`.
+    '''
+    imgs = np.asarray(imgs)
+    sin_lut, cos_lut, count = _slope_lut(imgs.shape[-2:])
+    fft2d = np.abs(np.fft.rfft2(imgs))
+    loc = (fft2d > fft2d.max(axis=(-1, -2), keepdims=True)*beta).astype(float)
+    n = np.tensordot(loc, count, axes=2)
+    S = np.tensordot(loc, sin_lut, axes=2)/n
+    C = np.tensordot(loc, cos_lut, axes=2)/n
+    slope = np.degrees(np.arctan2(S, C)%(2*np.pi))/4
+    delta = np.degrees(np.sqrt(-2*np.log(np.minimum(1, np.hypot(S, C)))))/4
+    return slope, delta
 
 def measurer(function, input_shape, dtype, name, *args, **kwargs):
     def appraise(x):
@@ -59,5 +164,183 @@ def measurer(function, input_shape, dtype, name, *args, **kwargs):
         name= name
     )
 
+def _scale_operators(size, sigma):
+    '''
+    Operadores lineares (matrizes) usados por `ScaleMeasurer` ao longo de um eixo de tamanho `size`.
+
+    Returns
+    -------
+    tuple
+        (derivative, blur, dft_cos, dft_sin, psd_cos, psd_sin):
+        - `derivative` e `blur`: `np.gradient` e `gaussian_filter` (modo `'reflect'`) aplicados a impulsos unitários,
+          `shape = [size, size]`, de modo que `x @ derivative` equivale a `np.gradient(x, axis=-1)`;
+        - `dft_cos` e `dft_sin`: partes real e imaginária da `rfft` com preenchimento de zeros usada por `PSD_batch`;
+        - `psd_cos` e `psd_sin`: composição da transformada inversa (autocorrelação no modo `'same'`) com a DFT final,
+          restrita às frequências positivas, tal que `PSD_batch(x)[..., 1:K+1]**2 == (P @ psd_cos)**2 + (P @ psd_sin)**2`, 
+          onde `P` é o espectro de potência.
+    '''
+    eye = np.eye(size)
+    derivative = np.gradient(eye, axis=1)
+    blur = gaussian_filter(eye, (0, sigma))
+
+    L = 1 << int(np.ceil(np.log2(2*size - 1)))
+    k = np.arange(L//2 + 1)
+    phase = 2*np.pi*np.outer(np.arange(size), k)/L
+    dft_cos, dft_sin = np.cos(phase), np.sin(phase)
+
+    lags = np.arange(size) + (size - 1)//2 - (size - 1)
+    weights = np.where((k == 0) | (k == L//2), 1, 2)
+    inverse = weights[:, np.newaxis]*np.cos(2*np.pi*np.outer(k, lags)/L)/L
+
+    q = np.arange(1, (size + 1)//2)
+    phase = 2*np.pi*np.outer(np.arange(size), q)/size
+    return derivative, blur, dft_cos, dft_sin, inverse @ np.cos(phase), inverse @ np.sin(phase)
+
+def _mode_index(indices, depth):
+    '''
+    Moda (menor índice em caso de empate) de `indices` ao longo do último eixo.
+    '''
+    counts = tf.reduce_sum(tf.one_hot(indices, depth, dtype=tf.int32), axis=-2)
+    return tf.argmax(counts*depth - tf.range(depth), axis=-1, output_type=tf.int32)
+
+class ScaleMeasurer(Layer):
+    '''
+    Versão em TensorFlow de `find_scale_batch`, vetorizada sobre o lote.
+
+    Todas as etapas (gradiente, filtro gaussiano, autocorrelação e espectro) são lineares ao longo de cada eixo e 
+    são pré-compostas em matrizes, de modo que a camada consiste apenas em multiplicações de matrizes, `argmax` e contagens,
+    podendo ser compilada via XLA e exportada para TFLite. Com `dtype='float64'` os resultados coincidem com os de `find_scale_batch`.
+
+    Parameters
+    ----------
+    sigma : float, default=2
+        Desvio padrão do filtro gaussiano aplicado aos gradientes.
+
+    Returns
+    -------
+    tf.Tensor
+        (scale, delta_scale), `shape = [n_batch, 2]`.
+    '''
+    def __init__(self, sigma=2, **kwargs):
+        super().__init__(**kwargs)
+        self.sigma = sigma
+
+    def build(self, input_shape):
+        h, w = input_shape[1:3]
+        const = lambda x: tf.constant(x, dtype=self.compute_dtype)
+        dh, bh, ch, sh, pch, psh = _scale_operators(h, self.sigma)
+        dw, bw, cw, sw, pcw, psw = _scale_operators(w, self.sigma)
+        # direção x: linhas de gaussian(gradient(x, axis=1)); direção y: colunas de gaussian(gradient(x, axis=0))
+        self.x_left, self.x_cos, self.x_sin = const(bh.T), const(dw @ bw @ cw), const(dw @ bw @ sw)
+        self.x_psd_cos, self.x_psd_sin = const(pcw), const(psw)
+        self.y_cos, self.y_sin, self.y_right = const(ch.T @ bh.T @ dh.T), const(sh.T @ bh.T @ dh.T), const(bw)
+        self.y_psd_cos, self.y_psd_sin = const(pch.T), const(psh.T)
+        self.shape = (h, w)
+        super().build(input_shape)
+
+    def _frequency(self, power, psd_cos, psd_sin, size, transpose):
+        if transpose:
+            psd = tf.square(tf.matmul(psd_cos, power)) + tf.square(tf.matmul(psd_sin, power))
+            psd = tf.transpose(psd, (0, 2, 1))
+        else:
+            psd = tf.square(tf.matmul(power, psd_cos)) + tf.square(tf.matmul(power, psd_sin))
+        depth = (size - 1)//2
+        mode = _mode_index(tf.argmax(psd, axis=-1, output_type=tf.int32), depth)
+        return tf.cast(mode + 1, self.compute_dtype)*(1.0/size)
+
+    def call(self, x):
+        if x.shape.rank == 4: x = x[..., 0]
+        h, w = self.shape
+
+        left = tf.matmul(self.x_left, x)
+        power = tf.square(tf.matmul(left, self.x_cos)) + tf.square(tf.matmul(left, self.x_sin))
+        fx = self._frequency(power, self.x_psd_cos, self.x_psd_sin, w, transpose=False)
+
+        right = tf.matmul(x, self.y_right)
+        power = tf.square(tf.matmul(self.y_cos, right)) + tf.square(tf.matmul(self.y_sin, right))
+        fy = self._frequency(power, self.y_psd_cos, self.y_psd_sin, h, transpose=True)
+
+        dx, dy = 0.5/w, 0.5/h
+        return tf.stack((fx*fy, tf.sqrt((dx*fy)**2 + (dy*fx)**2)), axis=-1)
+
+    def get_config(self):
+        return {**super().get_config(), 'sigma': self.sigma}
+
+class SlopeMeasurer(Layer):
+    '''
+    Versão em TensorFlow de `find_slope_batch`, vetorizada sobre o lote.
+
+    A DFT 2D é calculada através de multiplicações de matrizes (apenas metade do espectro, como na `rfft2`), e as médias
+    circulares através das tabelas de `_slope_lut`; a camada pode ser compilada via XLA e exportada para TFLite.
+
+    Parameters
+    ----------
+    beta : float, default=3e-3
+        Limiar, relativo ao máximo do espectro de cada imagem, a partir do qual as frequências são consideradas.
+
+    Returns
+    -------
+    tf.Tensor
+        (slope, delta_slope), `shape = [n_batch, 2]`.
+    '''
+    def __init__(self, beta=3e-3, **kwargs):
+        super().__init__(**kwargs)
+        self.beta = beta
+
+    def build(self, input_shape):
+        h, w = input_shape[1:3]
+        const = lambda x: tf.constant(x, dtype=self.compute_dtype)
+        phase = 2*np.pi*np.outer(np.arange(h), np.arange(h))/h
+        self.h_cos, self.h_sin = const(np.cos(phase)), const(np.sin(phase))
+        phase = 2*np.pi*np.outer(np.arange(w), np.arange(w//2 + 1))/w
+        self.w_cos, self.w_sin = const(np.cos(phase)), const(np.sin(phase))
+        self.sin_lut, self.cos_lut, self.count = map(const, _slope_lut((h, w)))
+        super().build(input_shape)
+
+    def call(self, x):
+        if x.shape.rank == 4: x = x[..., 0]
+        a, b = tf.matmul(x, self.w_cos), tf.matmul(x, self.w_sin)
+        real = tf.matmul(self.h_cos, a) - tf.matmul(self.h_sin, b)
+        imag = tf.matmul(self.h_sin, a) + tf.matmul(self.h_cos, b)
+        power = tf.square(real) + tf.square(imag)
+        loc = tf.cast(power > tf.reduce_max(power, axis=(1, 2), keepdims=True)*self.beta**2, self.compute_dtype)
+
+        n = tf.tensordot(loc, self.count, axes=2)
+        S = tf.tensordot(loc, self.sin_lut, axes=2)/n
+        C = tf.tensordot(loc, self.cos_lut, axes=2)/n
+        slope = tf.math.floormod(tf.math.atan2(S, C), 2*np.pi)*(45/np.pi)
+        delta = tf.sqrt(-2*tf.math.log(tf.minimum(tf.sqrt(S**2 + C**2), 1)))*(45/np.pi)
+        return tf.stack((slope, delta), axis=-1)
+
+    def get_config(self):
+        return {**super().get_config(), 'beta': self.beta}
+
+def build_measurer(layer, input_shape=Default.image_size, name=None, dtype='float32'):
+    '''
+    Cria um modelo a partir de uma camada de medição (`ScaleMeasurer` ou `SlopeMeasurer`), 
+    equivalente aos modelos criados por `measurer`, porém sem chamadas ao Python.
+
+    Parameters
+    ----------
+    layer : ScaleMeasurer or SlopeMeasurer
+        Camada de medição.
+    input_shape : tuple, default=Default.image_size
+        Formato das imagens, `(height, width)` ou `(height, width, 1)`.
+    name : str or None, default=None
+        Nome do modelo.
+    dtype : str, default='float32'
+        Tipo da entrada; utilize `'float64'` (também na camada) para reproduzir exatamente as funções em NumPy.
+
+    Returns
+    -------
+    tf.keras.Model
+
+    Exemples
+    --------
+    >>> scale_measurer = build_measurer(ScaleMeasurer(sigma=2), name='scale_measurer')
+    '''
+    X = Input(input_shape, dtype=dtype)
+    return Model(inputs=X, outputs=layer(X), name=name)
+
 def scale_from_mask(area, mask):
     return area/mask.sum(axis=(-1, -2))
\ No newline at end of file
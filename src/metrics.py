@@ -1,3 +1,4 @@
+import numpy as np
 import tensorflow as tf
 from tensorflow.keras.losses import Loss
 from tensorflow.keras.metrics import mape
@@ -51,17 +52,16 @@ class TopK(Loss):
     def __init__(self, k, image_shape):
         super().__init__()
         assert 0 <= k <= 1
-        self.N = tf.cast(tf.reduce_prod(image_shape), tf.float32)
-        self.k = tf.cast(self.N*k, tf.int32) # k's threshold
-    
-    @tf.function
-    def top_k(self, x):
-        return tf.reduce_sum(tf.math.top_k(tf.reshape(x, [-1]), k=self.k, sorted=False).values)/self.N
+        self.N = int(np.prod(image_shape))
+        self.k = int(self.N*k) # k's threshold
     
     @tf.function
     def call(self, y_true, y_pred):
+        # top-k de todas as amostras do lote em uma única operação (sem tf.map_fn), compatível com XLA
+        y_pred = tf.cast(y_pred, tf.float32)
         loss = - y_true*tf.math.log(y_pred) - (1 - y_true)*tf.math.log(1 - y_pred)
-        return tf.map_fn(self.top_k, loss, fn_output_signature=tf.float32)
+        loss = tf.reshape(loss, [tf.shape(loss)[0], -1])
+        return tf.reduce_sum(tf.math.top_k(loss, k=self.k, sorted=False).values, axis=-1)/self.N
 
 class DiceTopK(Dice, TopK):
     def __init__(self, *args, **kwargs):
@@ -1,11 +1,15 @@
+import time
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 import tensorflow as tf
 import matplotlib.pyplot as plt
 from tensorflow.keras.models import load_model
 from tensorflow.keras import Input, Model, layers, callbacks
-from .config import Paths, add_dir_id
+from .config import Default, Paths, add_dir_id
 from .visualize import TrainingBoard
+from .measure import ScaleMeasurer
+from .evaluation import sweep_checkpoints
 
 def conv_block(x, filters:int):
     '''
@@ -83,26 +87,102 @@ def build_unet(input_shape:tuple, filters:tuple, name:str='unet', activation:str
     for f, jumper in zip(filters[::-1][1:], jumpers[::-1]):
         x = decoder(x, jumper, f)
     
-    outputs = layers.Conv2D(1, 1, padding='same', activation=activation)(x)
+    # a saída é sempre float32, mesmo com precisão mista (ver `precision_policy`)
+    outputs = layers.Conv2D(1, 1, padding='same', activation=activation, dtype='float32')(x)
     return Model(inputs=inputs, outputs=outputs, name=name)
 
+@contextmanager
+def precision_policy(policy=None):
+    '''
+    Define a política de precisão (ex.: `'mixed_bfloat16'`, recomendada para CPU, ou `'mixed_float16'`, para GPU)
+    das camadas criadas dentro do bloco `with`; `None` mantém a política atual.
+    '''
+    if policy is None:
+        yield
+        return
+    previous = tf.keras.mixed_precision.global_policy()
+    tf.keras.mixed_precision.set_global_policy(policy)
+    try:
+        yield
+    finally:
+        tf.keras.mixed_precision.set_global_policy(previous)
+
+def benchmark_training(filters:tuple=(16, 32, 64), batch_size:int=8, steps:int=50, warmup:int=5, loss='binary_crossentropy',
+                       jit_compile:bool=False, mixed_precision:str=None, steps_per_execution:int=1, seed:int=0):
+    '''
+    Mede a velocidade de treinamento (passos por segundo) de uma U-Net com dados sintéticos, sem salvar nada em disco.
+
+    Args:
+        filters (opcional): Número de filtros de cada etapa de codificação.
+        batch_size (opcional): Número de imagens por pacote.
+        steps (opcional): Número de passos medidos.
+        warmup (opcional): Número de passos executados antes da medição (tracing e compilação XLA).
+        loss (opcional): Função de perda.
+        jit_compile, mixed_precision, steps_per_execution (opcional): Ver `UNet.set_performance`.
+
+    Return:
+        Dicionário com os passos e imagens por segundo.
+    '''
+    rng = np.random.default_rng(seed)
+    x = rng.random((4*batch_size, *Default.image_size, 1), dtype=np.float32)
+    y = (x > 0.5).astype(np.float32)
+    data = tf.data.Dataset.from_tensor_slices((x, y)).repeat().batch(batch_size)
+
+    with precision_policy(mixed_precision):
+        model = build_unet(x.shape[1:], filters)
+    model.compile(optimizer='adam', loss=loss, jit_compile=jit_compile, steps_per_execution=steps_per_execution)
+    model.fit(data, steps_per_epoch=warmup*steps_per_execution, epochs=1, verbose=0)
+
+    start = time.perf_counter()
+    model.fit(data, steps_per_epoch=steps, epochs=1, verbose=0)
+    elapsed = time.perf_counter() - start
+    return {
+        'jit_compile': jit_compile,
+        'mixed_precision': mixed_precision,
+        'steps_per_execution': steps_per_execution,
+        'steps_per_sec': steps/elapsed,
+        'images_per_sec': steps*batch_size/elapsed
+    }
+
+def build_pac_model(unet, threshold:float=0.5, sigma:float=2, name:str='pac'):
+    '''
+    Construir o modelo completo do PAC: segmentação, área (em píxels) e escala em uma única chamada.
+
+    Args:
+        unet: U-Net (tf.keras.Model) já treinada, com entrada `[height, width, 1]`.
+        threshold (opcional): Limiar de probabilidade usado para contar os píxels da amostra (default: 0.5).
+        sigma (opcional): Desvio padrão do filtro gaussiano de `measure.ScaleMeasurer` (default: 2).
+        name (opcional): Nome que será atribuído ao modelo.
+    
+    Return:
+        pac: Modelo com as saídas [mask, area, scale]: mapa de probabilidades da U-Net, número de píxels acima de `threshold`
+            e área de um píxel (ver `measure.find_scale`); a área da amostra é `area*scale`.
+    '''
+    inputs = layers.Input(unet.input_shape[1:])
+    mask = unet(inputs)
+    area = layers.Lambda(lambda m: tf.reduce_sum(tf.cast(m > threshold, m.dtype), axis=(1, 2, 3)), name='area')(mask)
+    scale = layers.Lambda(lambda s: s[:, 0], name='scale')(ScaleMeasurer(sigma)(inputs))
+    return Model(inputs=inputs, outputs=[mask, area, scale], name=name)
+
 class UNet:
     '''
     Modelo de U-Net para segmentação de imagens.
 
     Args:
         name: Nome do modelo, será usado para salvá-lo ou importá-lo, se já houver sido salvo.
-        dataset: Tupla ou lista contendo as imagens de treino e validação no formato [(x_train, y_train), (x_test, y_test)].
+        dataset: Tupla ou lista contendo as imagens de treino e validação no formato [(x_train, y_train), (x_test, y_test)],
+            ou os `tf.data.Dataset` (não agrupados em lotes) de treino e validação no formato (train, test), como retornado por `data.stream_dataset`.
     
     Attr:
         x_train, y_train: Dados de treinamento.
         x_test, y_test: Dados de validação.
+        train_data, test_data: Dados de treinamento e validação, quando fornecidos como `tf.data.Dataset`.
         *Qualquer outro atributo ou método pretencente à classe tf.keras.Model.
     '''
     def __init__(self, name, dataset=None):
         self.name = name
-        if dataset is None: dataset = [[None]*2]*2
-        (self.x_train, self.y_train), (self.x_test, self.y_test) = dataset
+        self.set_dataset(dataset)
+        self.set_performance()
         self._dir = Paths.models/self.name
         self._logs_path = self._dir/'logs.csv'
     
@@ -112,10 +192,20 @@ class UNet:
         '''
         return getattr(self.model, name)
     
+    @property
+    def streaming(self):
+        return self.train_data is not None
+
     def _check_dataset(self):
-        if None in (self.x_train, self.y_train, self.x_test, self.y_test):
+        if not self.streaming and any(data is None for data in (self.x_train, self.y_train, self.x_test, self.y_test)):
             raise Exception('O dataset não está definido, utilize set_dataset para defini-lo.')
     
+    def _batched(self, dataset, batch_size, augmentation=None):
+        dataset = dataset.batch(batch_size)
+        if augmentation is not None:
+            dataset = augmentation.apply(dataset)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
     def build(self, filters:tuple, activation:str='sigmoid'):
         '''
         Construir U-Net.
@@ -137,18 +227,71 @@ class UNet:
             self.name = str(self._dir.stem)
             self._logs_path = self._dir/'logs.csv'
 
-        self.model = build_unet(input_shape=self.x_train.shape[1:], filters=filters, name=self.name, activation=activation)
+        input_shape = self.train_data.element_spec[0].shape if self.streaming else self.x_train.shape[1:]
+        with precision_policy(self.mixed_precision):
+            self.model = build_unet(input_shape=input_shape, filters=filters, name=self.name, activation=activation)
+        return self
+
+    def set_performance(self, jit_compile:bool=False, mixed_precision:str=None, steps_per_execution:int=1):
+        '''
+        Modo de desempenho do treinamento.
+
+        Args:
+            jit_compile (opcional): Compilar os passos de treinamento e avaliação com XLA (na CPU costuma ser mais lento).
+            mixed_precision (opcional): Política de precisão mista das camadas (`'mixed_bfloat16'` na CPU, `'mixed_float16'` na GPU);
+                só tem efeito sobre modelos criados por `build` depois desta chamada.
+            steps_per_execution (opcional): Número de passos executados a cada chamada da função de treinamento.
+
+        Return:
+            unet: Objeto segmentation.UNet.
+        '''
+        self.jit_compile = jit_compile
+        self.mixed_precision = mixed_precision
+        self.steps_per_execution = steps_per_execution
         return self
 
-    def evaluate(self, **kwargs):
-        return self.model.evaluate(self.x_test, self.y_test, **kwargs)
+    def compile(self, optimizer='rmsprop', **kwargs):
+        '''
+        Mesmo que `tf.keras.Model.compile`, aplicando o modo de desempenho (ver `set_performance`).
+        '''
+        kwargs.setdefault('jit_compile', self.jit_compile)
+        kwargs.setdefault('steps_per_execution', self.steps_per_execution)
+        if self.model.compute_dtype == 'float16' and not isinstance(optimizer, tf.keras.mixed_precision.LossScaleOptimizer):
+            optimizer = tf.keras.mixed_precision.LossScaleOptimizer(tf.keras.optimizers.get(optimizer))
+        return self.model.compile(optimizer=optimizer, **kwargs)
+
+    def evaluate(self, batch_size=32, **kwargs):
+        if self.streaming:
+            return self.model.evaluate(self._batched(self.test_data, batch_size), **kwargs)
+        return self.model.evaluate(self.x_test, self.y_test, batch_size=batch_size, **kwargs)
     
+    def evaluate_checkpoints(self, batch_size:int=64, epochs=None, workers:int=1, sort_by:str=None, jpg_files=None):
+        '''
+        Avalia todos os checkpoints salvos por `fit` (`weights.*.h5`) no conjunto de teste e salva a classificação em `checkpoints.csv`.
+
+        Args:
+            batch_size (opcional): Número de imagens por lote.
+            epochs (opcional): Épocas avaliadas (default: todas).
+            workers (opcional): Número de processos; cada um carrega o modelo salvo e avalia parte dos checkpoints.
+            sort_by (opcional): Coluna da classificação (ver `evaluation.sweep_checkpoints`).
+            jpg_files (opcional): Imagens avaliadas (default: as amostras de `Paths.test`).
+
+        Return:
+            pd.DataFrame com `epoch`, `IoU`, `DSC`, `area_mape`, `area_error` e `area_mae`, do melhor para o pior checkpoint.
+        '''
+        table = sweep_checkpoints(
+            self.model, self._dir, jpg_files, batch_size, epochs, workers,
+            model_path= self._dir/f'{self.name}.h5', sort_by= sort_by
+        )
+        table.to_csv(self._dir/'checkpoints.csv', index=False)
+        return table
+
     def delete(self):
         for filepath in self._dir.glob('*'):
             filepath.unlink()
         self._dir.rmdir()
     
-    def fit(self, epochs:int, batch_size:int, plot:bool, period:int=10, ranking:bool=False):
+    def fit(self, epochs:int, batch_size:int, plot:bool, period:int=10, ranking:bool=False, augmentation=None):
         '''
         Treinamento da rede.
 
@@ -156,6 +299,7 @@ class UNet:
             epochs: Número de épocas de treimento.
             batch_size: Número de imagens por pacote.
             period (opcional): Período de atualização dos gráficos sobre o treinamento do modelo.
+            augmentation (opcional): `augmentation.Augmentation` aplicado a cada lote de treinamento; os dados de validação não são alterados.
         '''
         self._check_dataset()
 
@@ -167,16 +311,35 @@ class UNet:
 
         default_callbacks = [
             callbacks.CSVLogger(self._logs_path, append=True),
-            callbacks.ModelCheckpoint(self._dir/'weights.{epoch:04d}.h5', verbose=0, save_weights_only=True),
-            callbacks.ModelCheckpoint(self._dir/f'{self.name}.h5', verbose=0, save_weights_only=False),
+            callbacks.ModelCheckpoint(str(self._dir/'weights.{epoch:04d}.h5'), verbose=0, save_weights_only=True),
+            callbacks.ModelCheckpoint(str(self._dir/f'{self.name}.h5'), verbose=0, save_weights_only=False),
         ]
         if plot: default_callbacks.append(TrainingBoard(self, period, ranking))
 
+        if self.streaming:
+            data = {
+                'x': self._batched(self.train_data, batch_size, augmentation),
+                'validation_data': self._batched(self.test_data, batch_size)
+            }
+        elif augmentation is not None:
+            train_data = tf.data.Dataset.from_tensor_slices((self.x_train, self.y_train)).shuffle(
+                len(self.x_train), seed=augmentation.seed, reshuffle_each_iteration=True
+            )
+            data = {
+                'x': self._batched(train_data, batch_size, augmentation),
+                'validation_data': (self.x_test, self.y_test),
+                'validation_batch_size': batch_size
+            }
+        else:
+            data = {
+                'x': self.x_train,
+                'y': self.y_train,
+                'validation_data': (self.x_test, self.y_test),
+                'batch_size': batch_size
+            }
+
         return self.model.fit(
-            self.x_train,
-            self.y_train,
-            validation_data= (self.x_test, self.y_test),
-            batch_size= batch_size,
+            **data,
             epochs= epochs + initial_epoch,
             initial_epoch= initial_epoch,
             verbose= 1,
@@ -200,6 +363,16 @@ class UNet:
         self.model.load_weights(self._dir/f'weights.{epoch}.h5')
     
     def get_dataset(self):
+        '''
+        Dados de treinamento e validação no formato [(x_train, y_train), (x_test, y_test)].
+        
+        Obs.: Se os dados foram fornecidos como `tf.data.Dataset`, eles serão carregados inteiramente na memória.
+        '''
+        if self.streaming:
+            return tuple(
+                tuple(map(np.stack, zip(*data.as_numpy_iterator())))
+                for data in (self.train_data, self.test_data)
+            )
         return ((self.x_train, self.y_train),
                 (self.x_test, self.y_test))
     
@@ -207,7 +380,13 @@ class UNet:
         return pd.read_csv(self._logs_path)
     
     def set_dataset(self, dataset):
-        self.dataset = dataset
+        if dataset is None: dataset = [[None]*2]*2
+        if isinstance(dataset[0], tf.data.Dataset):
+            self.train_data, self.test_data = dataset
+            (self.x_train, self.y_train), (self.x_test, self.y_test) = [[None]*2]*2
+        else:
+            self.train_data = self.test_data = None
+            (self.x_train, self.y_train), (self.x_test, self.y_test) = dataset
         
     def save(self):
         '''
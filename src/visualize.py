@@ -1,10 +1,17 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
 from matplotlib.style import use
+import tensorflow as tf
 from tensorflow.keras.callbacks import Callback
 from skimage.color import label2rgb
-from IPython.display import display, clear_output, HTML
+from IPython.display import display, clear_output, HTML, Image
 
 def plot_image(image, ax=None, **kwargs):
     ax = (ax if ax is not None else plt)
@@ -26,28 +33,52 @@ def set_custom_style():
         'lines.linewidth':2
     })
 
-def plot_training(unet, clear=False, ranking=False):
+def sample_dataset(x, y, size=None, seed=0):
+    '''
+    Subconjunto fixo de até `size` amostras de `(x, y)`, sorteadas com `seed`; se `x` for um `tf.data.Dataset` (não agrupado em lotes)
+    de pares `(x, y)`, são usadas as suas primeiras `size` amostras.
+    '''
+    if isinstance(x, tf.data.Dataset):
+        x, y = map(np.stack, zip(*x.take(size or -1).as_numpy_iterator()))
+    else: # `np.ndarray`, `tf.Tensor` ou listas
+        x, y = np.asarray(x), np.asarray(y)
+    if size is None or size >= len(x):
+        return x, y
+    index = np.sort(np.random.default_rng(seed).choice(len(x), size, replace=False))
+    return x[index], y[index]
 
-    # ==================== Model info ====================
-    y_pred_test = unet.model.predict(unet.x_test, verbose=0)
-    y_pred_train = unet.model.predict(unet.x_train, verbose=0)
-    area_pred_test = np.mean(y_pred_test, axis=(-1, -2, -3))
-    area_pred_train = np.mean(y_pred_train, axis=(-1, -2, -3))
-
-    j = np.random.randint(len(y_pred_test))
-    img = unet.x_test[j, ..., 0]
-    gtruth = unet.y_test[j, ..., 0]
-    pred = y_pred_test[j, ..., 0]
+def training_snapshot(model, train, test, logs, seed=None):
+    '''
+    Dados necessários para `draw_training`: predições de `model` para as amostras de treino e validação `train` e `test`
+    (tuplas `(x, y)`), histórico `logs` (pandas.DataFrame) e uma imagem de validação sorteada para a segmentação.
+    '''
+    (x_train, y_train), (x_test, y_test) = train, test
+    y_pred_test = model.predict(x_test, verbose=0)
+    y_pred_train = model.predict(x_train, verbose=0)
+    j = np.random.default_rng(seed).integers(len(y_pred_test))
+    return {
+        'image': x_test[j, ..., 0],
+        'truth': y_test[j, ..., 0],
+        'pred': y_pred_test[j, ..., 0],
+        'area_train': (np.mean(y_train, axis=(-1, -2, -3)), np.mean(y_pred_train, axis=(-1, -2, -3))),
+        'area_test': (np.mean(y_test, axis=(-1, -2, -3)), np.mean(y_pred_test, axis=(-1, -2, -3))),
+        'logs': logs,
+        'metrics': [metric.name for metric in model.metrics[1:]]
+    }
 
-    logs = unet.get_logs()
-    best_epoch = logs.epoch[np.argmin(logs.val_area_mape)]
-    n_metrics = len(unet.model.metrics) - 1
+def draw_training(fig, snapshot):
+    '''
+    Desenha em `fig` (matplotlib.figure.Figure) o painel de treinamento a partir de `training_snapshot`.
+    '''
+    logs = snapshot['logs']
+    sort_col = 'val_area_mape' if 'val_area_mape' in logs.columns else 'val_loss'
+    best_epoch = logs.epoch.iloc[np.argmin(logs[sort_col])]
+    n_metrics = len(snapshot['metrics'])
 
     # ==================== Figure config ====================
-    fig = plt.figure(figsize=(18, 7))
     main_grid = GridSpec(10, 4, figure=fig)
     mh = 4
-    metrics_grid = main_grid[-mh:, :].subgridspec(1, n_metrics)
+    metrics_grid = main_grid[-mh:, :].subgridspec(1, max(n_metrics, 1))
 
     axs = {
         'seg': fig.add_subplot(main_grid[:-mh, 0]),
@@ -56,7 +87,7 @@ def plot_training(unet, clear=False, ranking=False):
     }
 
     # ==================== Segmentation ====================
-    plot_seg_contour(img, gtruth, pred, 0.5, axs['seg'])
+    plot_seg_contour(snapshot['image'], snapshot['truth'], snapshot['pred'], 0.5, axs['seg'])
 
     # ==================== Loss ====================
     axs['loss'].plot(logs.epoch, logs.loss, label='loss')
@@ -69,8 +100,8 @@ def plot_training(unet, clear=False, ranking=False):
     axs['loss'].legend()
 
     # ==================== Precision ====================
-    axs['prec'].scatter(np.mean(unet.y_train, axis=(-1, -2, -3)), area_pred_train, alpha=0.7, label='training data')
-    axs['prec'].scatter(np.mean(unet.y_test, axis=(-1, -2, -3)), area_pred_test, alpha=0.7, label='validation data')
+    axs['prec'].scatter(*snapshot['area_train'], alpha=0.7, label='training data')
+    axs['prec'].scatter(*snapshot['area_test'], alpha=0.7, label='validation data')
     axs['prec'].set_aspect('equal')
     xmin, xmax = axs['prec'].get_xlim()
     dx = (xmax - xmin)*0.1
@@ -84,42 +115,125 @@ def plot_training(unet, clear=False, ranking=False):
     axs['prec'].legend()
     
     # ==================== Metrics ====================
-    for i, metric in enumerate(unet.model.metrics[1:]):
+    for i, name in enumerate(snapshot['metrics']):
         ax = fig.add_subplot(metrics_grid[0, i])
-        ax.plot(logs.epoch, logs[metric.name], label='training data')
-        ax.plot(logs.epoch, logs[f'val_{metric.name}'], label=f'validation data')
-        if metric.name not in ['DSC', 'IoU']: ax.semilogy()
+        ax.plot(logs.epoch, logs[name], label='training data')
+        ax.plot(logs.epoch, logs[f'val_{name}'], label=f'validation data')
+        if name not in ['DSC', 'IoU']: ax.semilogy()
         ax.set_xlabel('epoch')
-        ax.set_ylabel(metric.name)
+        ax.set_ylabel(name)
         ax.grid(True)
         ax.legend()
     
-    # ==================== Show ====================
     fig.tight_layout()
+    return fig
+
+def display_ranking(logs, ranking):
+    sort_col = 'val_area_mape'
+    display(
+        HTML(
+            logs.sort_values(
+                sort_col if sort_col in logs.columns else 'val_loss',
+                ascending=True
+            ).head(
+                int(ranking)
+            ).to_html()
+        )
+    )
+
+def plot_training(unet, clear=False, ranking=False, samples=None):
+    '''
+    Painel de treinamento da U-Net: segmentação de uma imagem de validação, curvas de perda e métricas
+    e comparação entre as áreas verdadeiras e preditas.
+
+    Args:
+        unet: Objeto segmentation.UNet.
+        clear (opcional): Limpar a saída da célula antes de exibir o painel.
+        ranking (opcional): Número de melhores épocas exibidas em uma tabela (`False` para não exibir).
+        samples (opcional): Número de imagens de treino e de validação avaliadas (`None` para todas).
+    '''
+    if unet.streaming:
+        train, test = (sample_dataset(data, None, samples) for data in (unet.train_data, unet.test_data))
+    else:
+        train, test = (sample_dataset(x, y, samples) for x, y in ((unet.x_train, unet.y_train), (unet.x_test, unet.y_test)))
+    logs = unet.get_logs()
+
+    fig = plt.figure(figsize=(18, 7))
+    draw_training(fig, training_snapshot(unet.model, train, test, logs))
     if clear: 
         clear_output(wait=True)
     plt.show()
 
     if ranking != False: 
-        sort_col = 'val_area_mape'
-        display(
-            HTML(
-                logs.sort_values(
-                    sort_col if sort_col in logs.columns else 'val_loss',
-                    ascending=True
-                ).head(
-                    int(ranking)
-                ).to_html()
-            )
-        )
+        display_ranking(logs, ranking)
 
 class TrainingBoard(Callback):
-    def __init__(self, unet, period, ranking):
+    '''
+    Painel de treinamento atualizado a cada `period` épocas sem bloquear o treinamento.
+
+    A cada atualização, apenas um subconjunto fixo de `samples` imagens de treino e de validação (sorteado no início do treinamento)
+    é avaliado; as curvas usam as métricas da época já calculadas pelo Keras, mantidas em memória (sem reler `logs.csv`).
+    O desenho é feito em uma thread e salvo em `path` (default: `board.png` no diretório do modelo); a figura pronta
+    é exibida no fim de uma época seguinte, e, se o desenho anterior ainda não terminou, a atualização é descartada.
+
+    Args:
+        unet: Objeto segmentation.UNet.
+        period: Período, em épocas, de atualização do painel.
+        ranking: Número de melhores épocas exibidas em uma tabela (`False` para não exibir).
+        samples (opcional): Número de imagens de treino e de validação avaliadas em cada atualização.
+        path (opcional): Arquivo PNG em que o painel é salvo.
+        seed (opcional): Semente do sorteio das amostras.
+    '''
+    def __init__(self, unet, period, ranking, samples=64, path=None, seed=0):
         super().__init__()
         self.unet = unet
         self.period = period
         self.ranking = ranking
+        self.samples = samples
+        self.path = path
+        self.seed = seed
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._rendering = None
+    
+    def on_train_begin(self, logs=None):
+        unet = self.unet
+        if unet.streaming:
+            self.train, self.test = (sample_dataset(data, None, self.samples, self.seed) for data in (unet.train_data, unet.test_data))
+        else:
+            self.train = sample_dataset(unet.x_train, unet.y_train, self.samples, self.seed)
+            self.test = sample_dataset(unet.x_test, unet.y_test, self.samples, self.seed)
+        try: self.history = unet.get_logs().to_dict('records')
+        except FileNotFoundError: self.history = []
+        if self.path is None: self.path = unet._dir/'board.png'
     
     def on_epoch_end(self, epoch, logs=None):
-        if epoch%self.period == 0:
-            plot_training(self.unet, clear=True, ranking=self.ranking)
\ No newline at end of file
+        self.history.append({'epoch': epoch, **(logs or {})})
+        self.show()
+        if epoch%self.period == 0 and self._rendering is None:
+            snapshot = training_snapshot(self.model, self.train, self.test, pd.DataFrame(self.history), seed=epoch)
+            self._rendering = self._executor.submit(self.render, snapshot)
+    
+    def on_train_end(self, logs=None):
+        self.show(wait=True)
+    
+    def render(self, snapshot):
+        fig = Figure(figsize=(18, 7))
+        FigureCanvasAgg(fig)
+        draw_training(fig, snapshot)
+        buffered = BytesIO()
+        fig.savefig(buffered, format='png')
+        Path(self.path).write_bytes(buffered.getvalue())
+        return buffered.getvalue(), snapshot['logs']
+    
+    def show(self, wait=False):
+        '''
+        Exibe o último painel desenhado, se já estiver pronto (ou, com `wait`, assim que ficar pronto).
+        '''
+        if self._rendering is None or not (wait or self._rendering.done()):
+            return
+        rendering, self._rendering = self._rendering, None
+        image, logs = rendering.result()
+        clear_output(wait=True)
+        display(Image(data=image))
+        if self.ranking != False:
+            display_ranking(logs, self.ranking)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+# Imagens sintéticas compartilhadas pelos testes das medições (escala e inclinação).
+
+def make_grid_images(n, shape, seed=0):
+    '''
+    Papel milimetrado sintético: linhas com período e inclinação aleatórios, com ruído.
+    '''
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[:shape[0], :shape[1]].astype(float)
+    imgs = []
+    for _ in range(n):
+        period, angle = rng.uniform(6, 20), np.radians(rng.uniform(0, 10))
+        u, v = x*np.cos(angle) + y*np.sin(angle), y*np.cos(angle) - x*np.sin(angle)
+        lines = np.maximum(np.cos(2*np.pi*u/period), np.cos(2*np.pi*v/period)) > 0.9
+        imgs.append(1 - 0.5*lines + 0.1*rng.standard_normal(shape))
+    return np.stack(imgs)
+
+def make_noise_images(n, shape, seed=0):
+    return np.random.default_rng(seed).random((n, *shape))
+
+@pytest.fixture
+def grid_images():
+    return make_grid_images
+
+@pytest.fixture(params=['grid', 'noise'])
+def images(request):
+    '''
+    Cada teste que usa esta fixture é executado com as imagens em grade e com ruído puro.
+    '''
+    return {'grid': make_grid_images, 'noise': make_noise_images}[request.param]
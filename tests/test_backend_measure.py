@@ -0,0 +1,34 @@
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+from src import measure
+
+# O backend é empacotado sem `src/` (o contexto do Docker é `pac-backend/`) e mantém cópias da medição da escala;
+# estes testes garantem que as cópias continuam equivalentes a `src/measure.py`.
+
+sys.path.insert(0, str(Path(__file__).parent.parent/'pac-backend'))
+os.environ.setdefault('PAC_PRELOAD', '0')
+from app import calculator, fused
+
+SHAPES = [(64, 64), (48, 80)]
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_calculator_find_scale(shape, images):
+    imgs = images(4, shape)
+    np.testing.assert_array_equal(calculator.PSD_batch(imgs), measure.PSD_batch(imgs))
+    np.testing.assert_array_equal(calculator.find_scale_batch(imgs), measure.find_scale_batch(imgs)[0])
+    np.testing.assert_array_equal(calculator.find_scale(imgs[0]), measure.find_scale(imgs[0])[0])
+
+@pytest.mark.parametrize('size', [48, 64, 81])
+def test_fused_scale_operators(size):
+    for copy, original in zip(fused.scale_operators(size, 2), measure._scale_operators(size, 2)):
+        np.testing.assert_array_equal(copy, original)
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_fused_scale_measurer(shape, images):
+    imgs = images(4, shape)
+    copy = measure.build_measurer(fused.ScaleMeasurer(2, dtype='float64'), shape, dtype='float64')
+    original = measure.build_measurer(measure.ScaleMeasurer(2, dtype='float64'), shape, dtype='float64')
+    np.testing.assert_array_equal(copy.predict(imgs, verbose=0), original.predict(imgs, verbose=0)[:, 0])
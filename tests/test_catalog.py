@@ -0,0 +1,31 @@
+import pytest
+from src.catalog import DatasetCatalog, match
+
+FILES = ['train/1.000_mm2', 'train/a/b/2.000_mm2', 'test/3.000_mm2', 'test/nested/4.000_mm2', '5.000_mm2']
+PATTERNS = ['**/*', '*', 'train/*', 'train/**/*', '*/*', '*/*/*', 'test/nested/*', '**/b/*', 'train/1.*']
+
+@pytest.fixture
+def dataset(tmp_path):
+    directory = tmp_path/'dataset'
+    for name in FILES:
+        for suffix in ('.jpg', '.png'):
+            path = directory/(name + suffix)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(name.encode())
+    return directory
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_match_follows_path_glob(dataset, pattern):
+    expected = {path.relative_to(dataset).as_posix() for path in dataset.glob(f'{pattern}.jpg')}
+    assert {name + '.jpg' for name in FILES if match(name + '.jpg', pattern)} == expected
+
+def test_star_does_not_cross_directories():
+    assert match('train/1.000_mm2.jpg', 'train/*')
+    assert not match('train/a/b/2.000_mm2.jpg', 'train/*')
+    assert match('train/a/b/2.000_mm2.jpg', 'train/**/*')
+
+def test_catalog_query_pattern(dataset, tmp_path):
+    catalog = DatasetCatalog(dataset, tmp_path/'catalog.sqlite')
+    assert catalog.files(pattern='train/*') == [dataset/'train/1.000_mm2.jpg']
+    assert len(catalog.files(pattern='**/*')) == len(FILES)
+    assert [area for area, in catalog.query(group='nested', columns=('area',))] == [4.0]
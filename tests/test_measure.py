@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+from scipy.stats import circmean, circstd, mode
+from src.measure import PSD, find_scale, find_scale_batch, find_slope, find_slope_batch
+
+# Implementações originais, uma imagem por vez, usadas como referência para as versões em lote.
+
+def reference_scale(img, sigma=2):
+    Iy, Ix = np.gradient(img)
+    fs, delta = [], []
+    for dI in (Ix, Iy.T):
+        freqs = np.fft.fftfreq(dI.shape[1], 1)
+        pos = freqs > 0
+        dI_gauss = gaussian_filter(dI, sigma)
+        D = np.apply_along_axis(lambda y: freqs[pos][np.argmax(PSD(y)[pos])], 1, dI_gauss)
+        fs.append(mode(D, keepdims=True).mode[0])
+        delta.append(0.5/dI.shape[1])
+    (fx, fy), (dx, dy) = fs, delta
+    return fx*fy, np.sqrt((dx*fy)**2 + (dy*fx)**2)
+
+def reference_slope(img, beta=3e-3):
+    fft2d = np.abs(np.fft.fftshift(np.fft.fft2(img)))
+    loc = fft2d > fft2d.max()*beta
+    X, Y = np.meshgrid(np.arange(-img.shape[1]//2, img.shape[1]//2), np.arange(-img.shape[0]//2, img.shape[0]//2))
+    H = 90 - np.degrees(np.arctan2(Y[loc], X[loc]))%90
+    return circmean(H, low=0, high=90), circstd(H, low=0, high=90)
+
+SHAPES = [(64, 64), (48, 80), (81, 50)]
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_find_scale_batch_matches_per_image(shape, images):
+    imgs = images(6, shape)
+    scale, delta = find_scale_batch(imgs)
+    assert scale.shape == delta.shape == (len(imgs),)
+    for img, s, d in zip(imgs, scale, delta):
+        np.testing.assert_allclose((s, d), find_scale(img))
+        np.testing.assert_allclose((s, d), reference_scale(img))
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_find_slope_batch_matches_per_image(shape, grid_images):
+    imgs = grid_images(6, shape)
+    slope, delta = find_slope_batch(imgs)
+    assert slope.shape == delta.shape == (len(imgs),)
+    for img, s, d in zip(imgs, slope, delta):
+        np.testing.assert_allclose((s, d), find_slope(img))
+        np.testing.assert_allclose((s, d), reference_slope(img), atol=1e-9)
+
+def test_find_scale_sigma(grid_images):
+    imgs = grid_images(3, (64, 64), seed=1)
+    for sigma in (1, 3):
+        np.testing.assert_allclose(find_scale_batch(imgs, sigma)[0], [reference_scale(img, sigma)[0] for img in imgs])
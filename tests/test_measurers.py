@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+import tensorflow as tf
+from src.measure import ScaleMeasurer, SlopeMeasurer, build_measurer, find_scale_batch, find_slope_batch
+
+# Paridade entre as camadas em TensorFlow (`ScaleMeasurer`, `SlopeMeasurer`) e as funções em NumPy.
+
+SHAPES = [(64, 64), (48, 80)]
+
+def measure(layer, imgs, dtype):
+    model = build_measurer(layer, imgs.shape[1:], dtype=dtype)
+    return model.predict(imgs.astype(dtype), verbose=0)
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_scale_measurer_float64(shape, images):
+    imgs = images(4, shape)
+    output = measure(ScaleMeasurer(sigma=2, dtype='float64'), imgs, 'float64')
+    scale, delta = find_scale_batch(imgs)
+    np.testing.assert_array_equal(output[:, 0], scale)
+    np.testing.assert_allclose(output[:, 1], delta, rtol=1e-12)
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_slope_measurer_float64(shape, images):
+    imgs = images(4, shape)
+    output = measure(SlopeMeasurer(beta=3e-3, dtype='float64'), imgs, 'float64')
+    np.testing.assert_allclose(output, np.stack(find_slope_batch(imgs), axis=-1), rtol=1e-9, atol=1e-9)
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_measurers_float32(shape, grid_images):
+    imgs = grid_images(4, shape)
+    scale = measure(ScaleMeasurer(sigma=2), imgs, 'float32')
+    np.testing.assert_allclose(scale, np.stack(find_scale_batch(imgs), axis=-1), rtol=1e-5)
+    slope = measure(SlopeMeasurer(beta=3e-3), imgs, 'float32')
+    np.testing.assert_allclose(slope, np.stack(find_slope_batch(imgs), axis=-1), rtol=1e-5, atol=1e-5)
+
+def test_measurer_in_compiled_function(grid_images):
+    imgs = grid_images(2, (64, 64))
+    layer = ScaleMeasurer(dtype='float64')
+    layer.build((None, 64, 64))
+    output = tf.function(layer, jit_compile=True)(tf.constant(imgs))
+    np.testing.assert_array_equal(output.numpy()[:, 0], find_scale_batch(imgs)[0])